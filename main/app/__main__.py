@@ -10,6 +10,8 @@ from data_puller import run as run_data_puller
 from webserver import run as run_webserver
 
 def main():
+    # The puller and the webserver share this process and its log file
+    logging.configure('app')
     logger = logging.get_logger(loglevel=baselogging.DEBUG, loggername=__name__)
     try:
         app_path = os.path.dirname(os.path.abspath(__file__))
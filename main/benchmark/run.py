@@ -0,0 +1,278 @@
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import tracemalloc
+import statistics
+import logging as baselogging
+from contextlib import contextmanager
+from datetime import datetime
+import numpy as np
+from flask import Flask
+from shared.config import get_config
+from shared.mylogging import logging
+from shared.rollups import RAW_RETENTION, RollupManager
+from shared.timeseries import SampleStore, import_json_snapshots
+from shared.dashboard import DashboardReader
+from data_puller.accounts import DEFAULT_ACCOUNT, Account, AccountPipeline, account_data_folder
+from data_puller.anomalies import anomaly_settings
+from data_puller.alerts import AlertDispatcher, FileSink
+from data_puller.fetcher import PoolFetcher
+from data_puller.generate_charts import create_render_pool
+from shared.chart_manifest import CHART_DATA_FILE, CHART_MODES
+from data_puller.update_data import aggregate_snapshot, render_charts
+from webserver.HomePage import HomePage
+from webserver.worker_table import WorkerTable
+from webserver.api import SummaryApi, WorkerSeriesApi, WorkersApi
+from webserver.charts import ChartCache, ChartView
+from webserver.events import EventBroker, EventStream
+from webserver.worker_charts import WorkerChartCache, WorkerChartView
+from .server import PoolApiServer
+from .synthetic import SyntheticPool, backfill, write_snapshots
+
+app_path = os.path.dirname(os.path.abspath(__file__))
+results_folder = os.path.join(app_path, '..', 'data', 'benchmarks')
+
+duration_pattern = re.compile(r'^(\d+(?:\.\d+)?)([smhd]?)$')
+duration_units = {'': 1, 's': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+# Function to parse a duration such as 90m, 1h or 30d into seconds
+def parse_duration(value):
+    match = duration_pattern.match(value.strip())
+    if not match:
+        raise argparse.ArgumentTypeError(f"Invalid duration: {value}")
+    return float(match.group(1)) * duration_units[match.group(2)]
+
+def parse_list(parse):
+    return lambda value: [parse(item) for item in value.split(',') if item.strip()]
+
+class StageTimer:
+    """Collects wall time, items processed and (when traced) peak Python heap per named stage."""
+
+    def __init__(self):
+        self.timings = {}
+        self.items = {}
+        self.peaks = {}
+        self.traced = False
+
+    @contextmanager
+    def stage(self, name, items=1):
+        if self.traced:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        yield
+        elapsed = time.perf_counter() - start
+        if self.traced:
+            self.peaks[name] = max(self.peaks.get(name, 0), tracemalloc.get_traced_memory()[1] - base)
+            return
+        self.timings.setdefault(name, []).append(elapsed)
+        self.items.setdefault(name, []).append(items)
+
+    def report(self):
+        stages = {}
+        for name, timings in self.timings.items():
+            total = sum(timings)
+            stages[name] = {
+                'runs': len(timings),
+                'mean_seconds': statistics.mean(timings),
+                'median_seconds': statistics.median(timings),
+                'min_seconds': min(timings),
+                'max_seconds': max(timings),
+                'items_per_second': sum(self.items[name]) / total if total > 0 else None,
+                'peak_heap_bytes': self.peaks.get(name),
+            }
+        return stages
+
+# Function to build a webserver app over a benchmark pipeline, with the same views and endpoints as flask_app
+def build_app(pipeline: AccountPipeline, chart_mode='png'):
+    app = Flask('webserver')
+    dashboard = DashboardReader(pipeline.data_folder, pipeline.store)
+    chart_cache = ChartCache(pipeline.charts_folder, interval=0)
+    worker_table = WorkerTable(dashboard)
+    views = {
+        '/': HomePage.as_view("Home", "index.html", worker_table=worker_table, dashboard=dashboard, chart_cache=chart_cache, app=app, chart_mode=chart_mode),
+        '/api/workers': WorkersApi.as_view("WorkersApi", worker_table=worker_table),
+        '/api/workers/<name>/series': WorkerSeriesApi.as_view("WorkerSeriesApi", store=pipeline.store, rollups=pipeline.rollups),
+        '/api/summary': SummaryApi.as_view("SummaryApi", dashboard=dashboard),
+        '/events': EventStream.as_view("Events", broker=EventBroker(dashboard, worker_table, chart_cache)),
+        '/charts/<name>': ChartView.as_view("Charts", cache=chart_cache),
+        '/workers/<name>/chart.<any(png, svg):fmt>': WorkerChartView.as_view("WorkerCharts", cache=WorkerChartCache(pipeline.store, pipeline.rollups)),
+    }
+    for path, view in views.items():
+        app.add_url_rule(path, view_func=view, endpoint=path, methods=['GET'])
+    return app
+
+# Function to get the size of everything under a folder
+def folder_size(folder):
+    size = 0
+    for root, _, files in os.walk(folder):
+        for file in files:
+            size += os.path.getsize(os.path.join(root, file))
+    return size
+
+def peak_rss():
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+def run_scenario(workers, history, args, logger):
+    timer = StageTimer()
+    folder = tempfile.mkdtemp(prefix='litepool-bench-')
+    server = PoolApiServer().start()
+    fetcher = None
+    render_pool = create_render_pool(args.render_processes) if args.render_processes else None
+    try:
+        data_folder = os.path.join(folder, 'data')
+        charts_folder = os.path.join(folder, 'charts')
+        pools = [SyntheticPool(workers, churn=args.churn, seed=args.seed + i) for i in range(args.accounts)]
+        accounts = [Account(DEFAULT_ACCOUNT if i == 0 else f'bench{i}', server.endpoint, f'key{i}') for i in range(args.accounts)]
+
+        now = int(time.time() // args.interval) * args.interval
+        history_end = now - (args.polls + 1) * args.interval
+        history_start = history_end - history
+
+        # History a long running puller would have left behind
+        samples = int(history // args.interval) * workers * args.accounts
+        with timer.stage('backfill', samples):
+            for pool, account in zip(pools, accounts):
+                store = SampleStore(os.path.join(account_data_folder(data_folder, account.name), 'samples'))
+                backfill(pool, store, RollupManager(store), history_start, history_end, args.interval, RAW_RETENTION)
+
+        # One-shot import of legacy JSON snapshots into a separate store
+        snapshot_folder = os.path.join(folder, 'snapshots')
+        write_snapshots(SyntheticPool(workers, churn=args.churn, seed=args.seed), snapshot_folder,
+                        history_end - args.snapshots * args.interval, args.snapshots, args.interval)
+        with timer.stage('import', args.snapshots * workers):
+            import_json_snapshots(SampleStore(os.path.join(folder, 'imported')), snapshot_folder)
+
+        with timer.stage('startup', args.accounts):
+            pipelines = [AccountPipeline(account, data_folder, charts_folder, anomaly_settings=anomaly_settings(get_config()))
+                         for account in accounts]
+
+        fetcher = PoolFetcher(max_concurrency=min(args.accounts, 4), timeout=60, retries=0)
+        alerts = AlertDispatcher(FileSink(os.path.join(folder, 'alerts')), ['bench@localhost'], logger, coalesce_seconds=1)
+        client = build_app(pipelines[0], args.chart_mode).test_client()
+        pass_key = get_config().pass_key
+        query = f"?access_key={pass_key}" if pass_key else ''
+        name = pools[0].names[0]
+        chart = CHART_DATA_FILE if args.chart_mode == 'client' else 'hashrate_stats_line_graph.png'
+        pages = ['/', '/api/workers', '/api/summary', f'/api/workers/{name}/series',
+                 f'/api/workers/{name}/series?from={history_start}', f'/charts/{chart}',
+                 f'/workers/{name}/chart.png']
+        pages = [page + (query.replace('?', '&') if '?' in page else query) for page in pages]
+
+        # One extra poll runs traced for the heap peaks, so tracemalloc does not slow down the timed ones
+        for poll in range(args.polls + 1):
+            tick = history_end + (poll + 1) * args.interval
+            timer.traced = poll == args.polls
+            if timer.traced:
+                tracemalloc.start()
+            for pool, account in zip(pools, accounts):
+                server.publish(account.api_key, pool.snapshot(tick))
+
+            polled = workers * args.accounts
+            with timer.stage('fetch', polled):
+                results = fetcher.fetch_all(accounts)
+            for _, data in results:
+                if isinstance(data, Exception):
+                    raise data
+            with timer.stage('persist', polled):
+                saved = [pipeline.store.append(tick, data['workers']) for pipeline, (_, data) in zip(pipelines, results)]
+            with timer.stage('aggregate', polled):
+                for pipeline, (_, data), records in zip(pipelines, results, saved):
+                    aggregate_snapshot(logger, pipeline, tick, data, records, alerts)
+            for pipeline in pipelines:
+                pipeline.worker_state.save(force=True)
+            with timer.stage('render', len(pipelines)):
+                for pipeline in pipelines:
+                    render_charts(pipeline, render_pool, args.chart_mode)
+            with timer.stage('serve', len(pages)):
+                for page in pages:
+                    response = client.get(page)
+                    if response.status_code != 200:
+                        raise RuntimeError(f"GET {page} returned {response.status_code}")
+            if timer.traced:
+                tracemalloc.stop()
+                timer.traced = False
+
+        return {
+            'workers': workers,
+            'history_seconds': history,
+            'accounts': args.accounts,
+            'samples_backfilled': samples,
+            'disk_bytes': folder_size(data_folder),
+            'stages': timer.report(),
+            'process_peak_rss_bytes': peak_rss(),
+        }
+    finally:
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        if fetcher:
+            fetcher.close()
+        if render_pool:
+            render_pool.shutdown()
+        server.stop()
+        shutil.rmtree(folder, ignore_errors=True)
+
+def versions():
+    import pandas
+    import matplotlib
+    import flask
+    import requests
+    return {'numpy': np.__version__, 'pandas': pandas.__version__, 'matplotlib': matplotlib.__version__,
+            'flask': flask.__version__ if hasattr(flask, '__version__') else None, 'requests': requests.__version__}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmark', description='Time the puller and webserver stages against a synthetic pool.')
+    parser.add_argument('--workers', type=parse_list(int), default=[10, 100, 1000], help='comma separated worker counts (default 10,100,1000)')
+    parser.add_argument('--history', type=parse_list(parse_duration), default=[3600.0, 86400.0], help='comma separated history lengths such as 1h,1d,30d (default 1h,1d)')
+    parser.add_argument('--accounts', type=int, default=1, help='accounts polled per tick (default 1)')
+    parser.add_argument('--polls', type=int, default=5, help='timed polls per scenario (default 5)')
+    parser.add_argument('--interval', type=parse_duration, default=60.0, help='poll interval of the synthetic history (default 60s)')
+    parser.add_argument('--churn', type=float, default=0.002, help='chance per poll that a connected worker drops out (default 0.002)')
+    parser.add_argument('--snapshots', type=int, default=60, help='legacy JSON snapshots to import (default 60)')
+    parser.add_argument('--render-processes', type=int, default=0, help='draw the charts in a pool of this many processes (default 0, inline)')
+    parser.add_argument('--chart-mode', choices=CHART_MODES, default='png', help="'client' only publishes the chart payload instead of drawing PNGs (default png)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='result file (default data/benchmarks/<timestamp>.json)')
+    args = parser.parse_args(argv)
+
+    logging.configure('benchmark')
+    logger = logging.get_logger(loglevel=baselogging.ERROR, loggername='benchmark')
+    started = datetime.now()
+    results = {
+        'started': started.isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'versions': versions(),
+        'settings': {key: value for key, value in vars(args).items() if key != 'output'},
+        'scenarios': [],
+    }
+    for history in args.history:
+        for workers in args.workers:
+            print(f"{workers} workers, {history / 3600:g}h history ...", flush=True)
+            scenario = run_scenario(workers, history, args, logger)
+            results['scenarios'].append(scenario)
+            for name, stage in scenario['stages'].items():
+                peak = f"{stage['peak_heap_bytes'] / 2**20:8.1f} MiB" if stage['peak_heap_bytes'] is not None else ''
+                print(f"  {name:<10} {stage['median_seconds'] * 1000:10.1f} ms  {stage['items_per_second'] or 0:14.0f}/s  {peak}", flush=True)
+
+    output = args.output or os.path.join(results_folder, started.strftime('%Y-%m-%d_%H.%M.%S') + '.json')
+    if os.path.dirname(output) and not os.path.exists(os.path.dirname(output)):
+        os.makedirs(os.path.dirname(output))
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+
+if __name__ == "__main__":
+    main()
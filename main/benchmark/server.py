@@ -0,0 +1,58 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+class PoolApiServer:
+    """Local stand-in for the pool API: GET /api?api_key=<key> returns the last snapshot published for key.
+
+    Snapshots are encoded once when published, so the timings cover the HTTP
+    round trip and the puller's decoding rather than the generator.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0):
+        self.responses = {}
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                key = parse_qs(url.query).get('api_key', [''])[0]
+                body = server.responses.get(key) if url.path == '/api' else None
+                server.requests += 1
+                if body is None:
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name='PoolApiServer', daemon=True)
+
+    @property
+    def endpoint(self):
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}/api?api_key='
+
+    def publish(self, api_key, snapshot):
+        self.responses[api_key] = json.dumps(snapshot).encode('utf-8')
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,74 @@
+import os
+import re
+import sys
+import json
+import argparse
+import subprocess
+
+app_path = os.path.dirname(os.path.abspath(__file__))
+main_folder = os.path.join(app_path, '..')
+
+# Entry points and the heavy modules they must not load just to start
+ENTRY_POINTS = {
+    'webserver.flask_app': ['pandas', 'matplotlib', 'PIL'],
+    'data_puller.update_data': ['pandas', 'matplotlib', 'PIL'],
+}
+DEFAULT_BUDGET = 0.6
+
+importtime_pattern = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+# Function to import module in a fresh interpreter with -X importtime, returns {module: (self us, cumulative us)}
+def measure_imports(module):
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=main_folder, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr}")
+    imports = {}
+    for line in result.stderr.splitlines():
+        match = importtime_pattern.match(line)
+        if match:
+            imports[match.group(4)] = (int(match.group(1)), int(match.group(2)))
+    return imports
+
+# Function to check one entry point against the budget, returns its report
+def check_entry_point(module, forbidden, budget, runs):
+    # Keep the fastest run, the first one also pays for cold disk caches
+    imports = min((measure_imports(module) for _ in range(runs)), key=lambda imports: imports[module][1])
+    total = imports[module][1] / 1e6
+    loaded = sorted(name for name in forbidden if name in imports)
+    slowest = sorted(imports.items(), key=lambda item: item[1][0], reverse=True)[:10]
+    return {
+        'module': module,
+        'seconds': total,
+        'budget_seconds': budget,
+        'forbidden_loaded': loaded,
+        'slowest': [{'module': name, 'self_seconds': own / 1e6, 'cumulative_seconds': cumulative / 1e6}
+                    for name, (own, cumulative) in slowest],
+        'ok': total <= budget and not loaded,
+    }
+
+# Function to check every entry point, exits non-zero if one is over budget or loads a heavy module
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmark.startup', description='Check the import time of the entry points.')
+    parser.add_argument('--budget', type=float, default=DEFAULT_BUDGET, help=f'seconds each entry point may take to import (default {DEFAULT_BUDGET})')
+    parser.add_argument('--runs', type=int, default=3, help='imports per entry point, the fastest counts (default 3)')
+    parser.add_argument('--output', help='also write the report to this JSON file')
+    args = parser.parse_args(argv)
+
+    reports = [check_entry_point(module, forbidden, args.budget, args.runs) for module, forbidden in ENTRY_POINTS.items()]
+    for report in reports:
+        status = 'ok' if report['ok'] else 'FAIL'
+        print(f"{report['module']:<26} {report['seconds'] * 1000:8.1f} ms  (budget {args.budget * 1000:.0f} ms)  {status}")
+        if report['forbidden_loaded']:
+            print(f"  loads {', '.join(report['forbidden_loaded'])} at import time")
+        if not report['ok']:
+            for entry in report['slowest']:
+                print(f"  {entry['self_seconds'] * 1000:8.1f} ms  {entry['module']}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(reports, f, indent=2)
+    return 0 if all(report['ok'] for report in reports) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
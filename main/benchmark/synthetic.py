@@ -0,0 +1,110 @@
+import os
+import json
+import numpy as np
+from datetime import datetime
+from shared.timeseries import SAMPLE_DTYPE, SampleStore
+
+class SyntheticPool:
+    """Fake litecoinpool account: a fleet of workers that drop out and come back.
+
+    Each step a connected worker disconnects with probability churn and a
+    disconnected one reconnects with probability recovery; a few connected
+    workers report a 0 hash rate. Seeded, so two runs see the same fleet.
+    """
+
+    def __init__(self, workers, churn=0.002, recovery=0.2, stall=0.001, seed=0):
+        self.rng = np.random.default_rng(seed)
+        self.names = [f'bench.rig{i:05d}' for i in range(workers)]
+        self.churn = churn
+        self.recovery = recovery
+        self.stall = stall
+        # kH/s, a mix of small GPU rigs and ASICs
+        self.base_rate = self.rng.lognormal(np.log(500000), 1.0, workers)
+        self.connected = np.ones(workers, dtype=bool)
+        self.valid_shares = np.zeros(workers, dtype=np.int64)
+        self.stale_shares = np.zeros(workers, dtype=np.int64)
+
+    def step(self):
+        """Advance the fleet by one poll, returns the (connected, hash_rate) arrays."""
+        count = len(self.names)
+        draw = self.rng.random(count)
+        self.connected = np.where(self.connected, draw >= self.churn, draw < self.recovery)
+        hashing = self.connected & (self.rng.random(count) >= self.stall)
+        hash_rate = np.where(hashing, self.base_rate * self.rng.normal(1.0, 0.05, count), 0.0).clip(0).round(1)
+        shares = (hash_rate / 1000).astype(np.int64)
+        self.valid_shares += shares
+        self.stale_shares += shares // 200
+        return self.connected, hash_rate
+
+    def snapshot(self, timestamp):
+        """Advance one poll and return it the way the API encodes it."""
+        connected, hash_rate = self.step()
+        workers = {}
+        for i, name in enumerate(self.names):
+            workers[name] = {
+                'hash_rate': float(hash_rate[i]),
+                'connected': bool(connected[i]),
+                'valid_shares': int(self.valid_shares[i]),
+                'stale_shares': int(self.stale_shares[i]),
+                'invalid_shares': 0,
+                'rewards': round(float(self.valid_shares[i]) * 1e-9, 8),
+                'rewards_24h': round(float(self.base_rate[i]) * 1e-7, 8),
+                'last_share_time': int(timestamp) if connected[i] else 0,
+            }
+        total = float(hash_rate.sum())
+        return {
+            'user': {
+                'hash_rate': total,
+                'paid_rewards': 0,
+                'unpaid_rewards': round(float(self.valid_shares.sum()) * 1e-9, 8),
+                'expected_24h_rewards': round(float(self.base_rate.sum()) * 1e-7, 8),
+            },
+            'workers': workers,
+            'pool': {'hash_rate': total * 20, 'active_users': 4000, 'pps_ratio': 1.0},
+            'network': {'hash_rate': total * 500, 'block_number': 2700000 + int(timestamp) // 150, 'difficulty': 3.5e7},
+            'market': {'ltc_usd': 70.0, 'ltc_eur': 65.0, 'ltc_btc': 0.001},
+        }
+
+    def samples(self, worker_ids, start, count, interval):
+        """Sample records for count polls from start on, as the puller would have stored them."""
+        records = np.empty(count * len(self.names), dtype=SAMPLE_DTYPE)
+        for i in range(count):
+            connected, hash_rate = self.step()
+            rows = records[i * len(self.names):(i + 1) * len(self.names)]
+            rows['ts'] = start + i * interval
+            rows['worker'] = worker_ids
+            rows['connected'] = connected
+            rows['hash_rate'] = hash_rate
+        return records
+
+# Function to fill a store with history, compacting and pruning day by day like a running puller would
+def backfill(pool: SyntheticPool, store: SampleStore, rollups, start, end, interval, raw_retention):
+    """Returns the number of samples generated."""
+    store.append(start, pool.snapshot(start)['workers'])
+    worker_ids = store.worker_ids(pool.names)
+    generated = len(pool.names)
+    tick = start + interval
+    while tick < end:
+        # An hour per batch keeps memory flat however long the history is
+        count = min(int(3600 // interval) or 1, int(np.ceil((end - tick) / interval)))
+        store.append_records(pool.samples(worker_ids, tick, count, interval))
+        generated += count * len(pool.names)
+        tick += count * interval
+        if int(tick // 86400) != int((tick - count * interval) // 86400) or tick >= end:
+            rollups.compact(tick)
+            store.prune(tick - raw_retention)
+    return generated
+
+# Function to write polls as legacy YYYY-mm-dd_HH.MM.SS.json snapshot files, returns the file names
+def write_snapshots(pool: SyntheticPool, folder, start, count, interval):
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+    files = []
+    for i in range(count):
+        timestamp = start + i * interval
+        # Snapshot file names are in local time
+        file = datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d_%H.%M.%S.json')
+        with open(os.path.join(folder, file), 'w') as f:
+            json.dump(pool.snapshot(timestamp), f)
+        files.append(file)
+    return files
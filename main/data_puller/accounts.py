@@ -0,0 +1,90 @@
+import os
+import re
+import time
+import threading
+from shared.config import Config
+from shared.timeseries import SampleStore
+from shared.rollups import RollupManager
+from shared.history import HISTORY_FILE, HistoryWriter
+from shared.transitions import TransitionLog, transitions_folder
+from shared.archive import SnapshotArchive, archive_folder
+from shared.worker_state import WorkerState
+from shared.dashboard import DashboardPublisher
+from .aggregator import HourlyAggregator
+from .anomalies import ANOMALY_STATE_FILE, AnomalyDetector
+
+DEFAULT_ACCOUNT = 'default'
+account_name_pattern = re.compile(r'^[A-Za-z0-9_.-]+$')
+
+class Account:
+    def __init__(self, name, api_endpoint, api_key):
+        if not account_name_pattern.match(name):
+            raise ValueError(f"Invalid account name '{name}', use letters, digits, '.', '_' and '-' only")
+        self.name = name
+        self.api_endpoint = api_endpoint
+        self.api_key = api_key
+
+    @property
+    def request_url(self):
+        return f'{self.api_endpoint}{self.api_key}'
+
+# Function to read the accounts to poll from the configuration
+def load_accounts(config: Config):
+    """The top level api-endpoint/api-key is the 'default' account, extra ones go in an 'accounts' list."""
+    accounts = []
+    if config.api_key and config.api_endpoint:
+        accounts.append(Account(DEFAULT_ACCOUNT, config.api_endpoint, config.api_key))
+    for entry in config.accounts:
+        accounts.append(Account(entry['name'], entry.get('api-endpoint') or config.api_endpoint, entry['api-key']))
+
+    names = [account.name for account in accounts]
+    duplicates = sorted(set(name for name in names if names.count(name) > 1))
+    if duplicates:
+        raise ValueError(f"Duplicate account names in secrets.json: {', '.join(duplicates)}")
+    return accounts
+
+# Function to get the folder an account's data lives in
+def account_data_folder(data_folder, account_name):
+    # The default account keeps the top level data folder the webserver reads
+    if account_name == DEFAULT_ACCOUNT:
+        return data_folder
+    return os.path.join(data_folder, 'accounts', account_name)
+
+class AccountPipeline:
+    """Per-account namespace: sample store with its rollups, hourly aggregates, worker state and the dashboard
+    snapshot published from it, transition log, and the optional snapshot archive, history database and hash rate
+    anomaly detector."""
+
+    def __init__(self, account: Account, data_folder, charts_folder, retention_days=None, history_retention_days=None,
+                 archive_retention_days=None, anomaly_settings=None):
+        self.account = account
+        self.data_folder = account_data_folder(data_folder, account.name)
+        if account.name == DEFAULT_ACCOUNT:
+            self.charts_folder = charts_folder
+        else:
+            self.charts_folder = os.path.join(self.data_folder, 'charts')
+        self.store = SampleStore(os.path.join(self.data_folder, 'samples'))
+        self.aggregator = HourlyAggregator(os.path.join(self.data_folder, 'hourly_aggregates.json'))
+        self.aggregator.load(self.store, time.time())
+        self.worker_state = WorkerState(self.data_folder)
+        self.dashboard = DashboardPublisher(self.data_folder)
+        self.transitions = TransitionLog(transitions_folder(self.data_folder))
+        # Workers already in the summary when the log was introduced start it with their current state
+        self.transitions.seed(self.store, self.worker_state.snapshot()[1], time.time())
+        self.rollups = RollupManager(self.store, retention_days)
+        self.rollups.recover()
+        # Only kept when archive-retention-days is set
+        self.archive = None
+        if archive_retention_days:
+            self.archive = SnapshotArchive(archive_folder(self.data_folder), archive_retention_days)
+        # Only kept when anomaly detection is enabled, anomaly_settings are the AnomalyDetector arguments
+        self.anomalies = None
+        if anomaly_settings is not None:
+            self.anomalies = AnomalyDetector(os.path.join(self.data_folder, ANOMALY_STATE_FILE), **anomaly_settings)
+            self.anomalies.load()
+        # Only kept when the sqlite history backend is enabled
+        self.history = None
+        if history_retention_days is not None:
+            self.history = HistoryWriter(os.path.join(self.data_folder, HISTORY_FILE), history_retention_days)
+        # Held while the aggregate and render stages use the aggregator
+        self.lock = threading.Lock()
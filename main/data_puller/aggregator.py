@@ -0,0 +1,186 @@
+import os
+import json
+import numpy as np
+from datetime import datetime
+from typing import TYPE_CHECKING
+from shared.timeseries import SampleStore
+
+# pandas is only imported where the chart inputs are built, polling does not need it
+if TYPE_CHECKING:
+    import pandas as pd
+
+BUCKET_SECONDS = 3600
+
+def _new_bucket():
+    return {'snapshots': 0, 'connected': 0, 'disconnected': 0, 'hash_sum': 0.0, 'hash_count': 0, 'hash_max': None, 'hash_min': None}
+
+class HourlyAggregator:
+    """Running hourly buckets of fleet statistics over a sliding window.
+
+    Each snapshot is folded in with fold() as whole sample columns; buckets that
+    fall out of the window are evicted, so the chart input never grows past
+    window_hours rows however much history the store keeps. last_seen is the
+    time of each worker's newest sample, indexed by the store's worker id.
+    """
+
+    def __init__(self, state_file, window_hours=24):
+        self.state_file = state_file
+        self.window = window_hours * 3600
+        self.buckets = {}
+        self.last_seen = np.zeros(0)
+        self.last_timestamp = None
+
+    # Function to make last_seen long enough for worker id max_id
+    def _grow(self, max_id):
+        if max_id >= len(self.last_seen):
+            self.last_seen = np.concatenate([self.last_seen, np.zeros(max_id + 1 - len(self.last_seen))])
+
+    def fold(self, timestamp, records):
+        """Fold in the sample records of the snapshot taken at timestamp."""
+        start = int(timestamp // BUCKET_SECONDS) * BUCKET_SECONDS
+        bucket = self.buckets.get(start)
+        if bucket is None:
+            bucket = self.buckets[start] = _new_bucket()
+
+        bucket['snapshots'] += 1
+        if len(records):
+            hash_rate = records['hash_rate']
+            connected = int(np.count_nonzero(records['connected']))
+            bucket['connected'] += connected
+            bucket['disconnected'] += len(records) - connected
+            bucket['hash_sum'] += float(hash_rate.sum())
+            bucket['hash_count'] += len(records)
+            hash_max = float(hash_rate.max())
+            hash_min = float(hash_rate.min())
+            bucket['hash_max'] = hash_max if bucket['hash_max'] is None else max(bucket['hash_max'], hash_max)
+            bucket['hash_min'] = hash_min if bucket['hash_min'] is None else min(bucket['hash_min'], hash_min)
+            self._grow(int(records['worker'].max()))
+            self.last_seen[records['worker']] = timestamp
+
+        self.last_timestamp = timestamp if self.last_timestamp is None else max(self.last_timestamp, timestamp)
+        self.evict(self.last_timestamp)
+
+    def evict(self, now):
+        cutoff = now - self.window
+        for start in [start for start in self.buckets if start + BUCKET_SECONDS <= cutoff]:
+            del self.buckets[start]
+
+    # Function to rebuild the buckets from the samples in the store
+    def rebuild(self, store: SampleStore, now):
+        self.buckets = {}
+        self.last_seen = np.zeros(0)
+        self.last_timestamp = None
+        samples = store.scan(start=now - self.window)
+        if len(samples) == 0:
+            return
+
+        # One pass of bincounts over the bucket index of every sample
+        starts, index = np.unique((samples['ts'] // BUCKET_SECONDS).astype(np.int64), return_inverse=True)
+        count = len(starts)
+        samples_per_bucket = np.bincount(index, minlength=count)
+        connected = np.bincount(index, weights=samples['connected'], minlength=count)
+        hash_sum = np.bincount(index, weights=samples['hash_rate'], minlength=count)
+        hash_max = np.full(count, -np.inf)
+        hash_min = np.full(count, np.inf)
+        np.maximum.at(hash_max, index, samples['hash_rate'])
+        np.minimum.at(hash_min, index, samples['hash_rate'])
+        snapshot_times = np.unique(samples['ts'])
+        snapshots = np.bincount(np.searchsorted(starts, (snapshot_times // BUCKET_SECONDS).astype(np.int64)), minlength=count)
+        for i, start in enumerate(starts.tolist()):
+            self.buckets[start * BUCKET_SECONDS] = {
+                'snapshots': int(snapshots[i]),
+                'connected': int(connected[i]),
+                'disconnected': int(samples_per_bucket[i] - connected[i]),
+                'hash_sum': float(hash_sum[i]),
+                'hash_count': int(samples_per_bucket[i]),
+                'hash_max': float(hash_max[i]),
+                'hash_min': float(hash_min[i]),
+            }
+        self._grow(int(samples['worker'].max()))
+        np.maximum.at(self.last_seen, samples['worker'], samples['ts'])
+        self.last_timestamp = float(samples['ts'][-1])
+
+    def load(self, store: SampleStore, now):
+        if os.path.exists(self.state_file):
+            try:
+                with open(self.state_file, 'r') as f:
+                    state = json.load(f)
+                self.buckets = {int(start): bucket for start, bucket in state['buckets'].items()}
+                self.last_seen = np.asarray(state['last_seen'], dtype=float)
+                self.last_timestamp = state['last_timestamp']
+                # Only trust the saved state if the store has nothing newer, otherwise rebuild
+                if self.last_timestamp is not None and self.last_timestamp >= (store.last_timestamp() or 0):
+                    self.evict(now)
+                    return
+            except (ValueError, KeyError, TypeError):
+                pass
+        self.rebuild(store, now)
+
+    def save(self):
+        state = {
+            'buckets': {str(start): bucket for start, bucket in self.buckets.items()},
+            'last_seen': self.last_seen.tolist(),
+            'last_timestamp': self.last_timestamp,
+        }
+        tmp_file = self.state_file + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_file, self.state_file)
+
+    # Chart inputs
+
+    def total_workers(self):
+        """Workers with a sample inside the window."""
+        if self.last_timestamp is None:
+            return 0
+        return int(np.count_nonzero(self.last_seen > self.last_timestamp - self.window))
+
+    def uptime_totals(self):
+        """(connected, disconnected) samples over the window."""
+        connected = sum(bucket['connected'] for bucket in self.buckets.values())
+        disconnected = sum(bucket['disconnected'] for bucket in self.buckets.values())
+        return connected, disconnected
+
+    def uptime_counts(self) -> 'pd.Series':
+        import pandas as pd
+
+        connected, disconnected = self.uptime_totals()
+        counts = pd.Series({'Connected': connected, 'Not Connected': disconnected})
+        return counts[counts > 0]
+
+    def hourly_columns(self):
+        """Every hour from the first bucket to the last (unix seconds) with the average connected workers
+        and hash rate mean/max/min, hours without snapshots are 0."""
+        if not self.buckets:
+            return {'hours': np.zeros(0, dtype=np.int64), **{key: np.zeros(0) for key in ('connected', 'mean', 'max', 'min')}}
+
+        starts = sorted(self.buckets)
+        buckets = [self.buckets[start] for start in starts]
+        hours = np.arange(starts[0], starts[-1] + BUCKET_SECONDS, BUCKET_SECONDS, dtype=np.int64)
+        positions = (np.array(starts, dtype=np.int64) - starts[0]) // BUCKET_SECONDS
+
+        def column(key):
+            values = np.zeros(len(hours))
+            values[positions] = np.fromiter((bucket[key] or 0 for bucket in buckets), dtype=float, count=len(buckets))
+            return values
+
+        snapshots = column('snapshots')
+        hash_count = column('hash_count')
+        return {
+            'hours': hours,
+            'connected': np.divide(column('connected'), snapshots, out=np.zeros(len(hours)), where=snapshots > 0),
+            'mean': np.divide(column('hash_sum'), hash_count, out=np.zeros(len(hours)), where=hash_count > 0),
+            'max': column('hash_max'),
+            'min': column('hash_min'),
+        }
+
+    def hourly_frame(self) -> 'pd.DataFrame':
+        """One row per hour (local time) with the average connected workers and hash rate mean/max/min."""
+        import pandas as pd
+
+        columns = self.hourly_columns()
+        hours = columns.pop('hours')
+        utc_offset = np.timedelta64(int(datetime.now().astimezone().utcoffset().total_seconds()), 's')
+        index = pd.DatetimeIndex(hours.astype('datetime64[s]') + utc_offset)
+        return pd.DataFrame(columns, index=index)
+
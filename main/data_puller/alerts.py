@@ -0,0 +1,207 @@
+import os
+import html
+import time
+import queue
+import smtplib
+import threading
+from datetime import datetime
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+from shared.config import Config
+from shared.metrics import REGISTRY
+
+alerts_raised = REGISTRY.counter('litepool_alerts_total', 'Worker alerts raised', ['kind'])
+emails_sent = REGISTRY.counter('litepool_emails_sent_total', 'Alert messages delivered to the sink')
+email_failures = REGISTRY.counter('litepool_email_failures_total', 'Alert messages the sink gave up on')
+email_send_seconds = REGISTRY.histogram('litepool_email_send_seconds', 'Time to hand one alert message to the sink, retries included')
+
+# Function to build the message sent to one recipient
+def build_message(sender, recipient, subject, plain_body, html_body):
+    msg = MIMEMultipart('alternative')
+    msg['Subject'] = subject
+    msg['From'] = sender
+    msg['To'] = recipient
+    msg['Reply-To'] = sender
+    msg['X-Mailer'] = 'Python smtplib'
+    msg.attach(MIMEText(plain_body, 'plain'))
+    msg.attach(MIMEText(html_body, 'html'))
+    return msg
+
+class SmtpSink:
+    """Sends through one authenticated SMTP connection that is kept open between digests."""
+
+    def __init__(self, server, port, user, password, use_ssl, use_tls, logger, retries=3, backoff=2.0):
+        self.server = server
+        self.port = port
+        self.user = user
+        self.password = password
+        self.use_ssl = use_ssl
+        self.use_tls = use_tls
+        self.logger = logger
+        self.retries = retries
+        self.backoff = backoff
+        self.connection = None
+
+    def _connect(self):
+        connection = smtplib.SMTP_SSL(self.server, self.port) if self.use_ssl else smtplib.SMTP(self.server, self.port)
+        if not self.use_ssl and self.use_tls:
+            connection.starttls()
+        connection.login(self.user, self.password)
+        return connection
+
+    def _connected(self):
+        if self.connection is None:
+            return False
+        try:
+            return self.connection.noop()[0] == 250
+        except smtplib.SMTPException:
+            return False
+        except OSError:
+            return False
+
+    def close(self):
+        if self.connection is not None:
+            try:
+                self.connection.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self.connection = None
+
+    def send(self, recipients, subject, plain_body, html_body):
+        pending = list(recipients)
+        for attempt in range(self.retries + 1):
+            if attempt:
+                time.sleep(self.backoff * 2 ** (attempt - 1))
+            try:
+                if not self._connected():
+                    self.close()
+                    self.connection = self._connect()
+                while pending:
+                    email = pending[0]
+                    msg = build_message(self.user, email, subject, plain_body, html_body)
+                    try:
+                        self.connection.sendmail(self.user, email, msg.as_string())
+                    except smtplib.SMTPRecipientsRefused as e:
+                        self.logger.error(f"Recipient refused for {email}: {e}")
+                    except smtplib.SMTPDataError as e:
+                        self.logger.error(f"Failed to send email to {email}: {e}")
+                    pending.pop(0)
+                return True
+            except (smtplib.SMTPServerDisconnected, OSError) as e:
+                self.logger.error(f"SMTP connection lost, retrying: {e}")
+                self.connection = None
+            except smtplib.SMTPException as e:
+                self.logger.error(f"SMTP error occurred: {e}")
+                self.close()
+        self.logger.error(f"Giving up on '{subject}' for {', '.join(pending)}")
+        return False
+
+class FileSink:
+    """Writes each message as a .eml file instead of sending it, for testing."""
+
+    def __init__(self, folder, sender='litepool@localhost'):
+        self.folder = folder
+        self.sender = sender
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+
+    def send(self, recipients, subject, plain_body, html_body):
+        stamp = datetime.now().strftime('%Y-%m-%d_%H.%M.%S.%f')
+        for i, email in enumerate(recipients):
+            msg = build_message(self.sender, email, subject, plain_body, html_body)
+            with open(os.path.join(self.folder, f'{stamp}_{i}.eml'), 'w') as f:
+                f.write(msg.as_string())
+        return True
+
+    def close(self):
+        pass
+
+# Function to send one message through a sink and count how it went
+def send_message(sink, recipients, subject, plain_body, html_body):
+    with email_send_seconds.time():
+        try:
+            sent = sink.send(recipients, subject, plain_body, html_body)
+        except Exception:
+            email_failures.inc()
+            raise
+    if sent:
+        emails_sent.inc()
+    else:
+        email_failures.inc()
+    return sent
+
+# Function to create the configured sink, returns None if alerts are not configured
+def create_sink(config: Config, logger):
+    if config.alert_sink == 'file':
+        app_path = os.path.dirname(os.path.abspath(__file__))
+        return FileSink(config.alert_sink_folder or os.path.join(app_path, '..', 'data', 'alerts'))
+    if config.smtp_server and config.smtp_port and config.smtp_user and config.smtp_password:
+        return SmtpSink(config.smtp_server, config.smtp_port, config.smtp_user, config.smtp_password,
+                        config.smtp_use_ssl, config.smtp_use_tls, logger)
+    return None
+
+# Function to turn a batch of worker events into one digest
+def build_digest(events):
+    if len(events) == 1:
+        event = events[0]
+        return event['subject'], event['plain_body'], event['html_body']
+
+    counts = {}
+    for event in events:
+        counts[event['kind']] = counts.get(event['kind'], 0) + 1
+    subject = f"{len(events)} worker alerts: " + ', '.join(f"{count} {kind}" for kind, count in sorted(counts.items()))
+    plain_body = '\n'.join(event['plain_body'] for event in events)
+    items = ''.join(f"<li>{html.escape(event['plain_body'])}</li>" for event in events)
+    html_body = f"""
+    <html>
+    <body>
+        <h2>{subject}</h2>
+        <ul>{items}</ul>
+    </body>
+    </html>
+    """
+    return subject, plain_body, html_body
+
+class AlertDispatcher:
+    """Queues worker alerts off the poll path and sends them as one digest per recipient.
+
+    The first event of a batch opens a window of coalesce_seconds; everything
+    queued before it closes goes out in the same message.
+    """
+
+    def __init__(self, sink, recipients, logger, coalesce_seconds=30):
+        self.sink = sink
+        self.recipients = recipients
+        self.logger = logger
+        self.coalesce_seconds = coalesce_seconds
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name='AlertDispatcher', daemon=True)
+        self.thread.start()
+
+    def notify(self, kind, subject, plain_body, html_body):
+        alerts_raised.inc(kind=kind)
+        self.queue.put({'kind': kind, 'subject': subject, 'plain_body': plain_body, 'html_body': html_body})
+
+    def _run(self):
+        while True:
+            events = [self.queue.get()]
+            deadline = time.monotonic() + self.coalesce_seconds
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    events.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self.flush(events)
+
+    def flush(self, events):
+        if not self.sink or not self.recipients:
+            self.logger.error(f"No alert sink or recipients configured, dropping {len(events)} alert(s)")
+            return
+        subject, plain_body, html_body = build_digest(events)
+        try:
+            send_message(self.sink, self.recipients, subject, plain_body, html_body)
+        except Exception as e:
+            self.logger.error(f"Failed to send alerts: {str(e)}")
@@ -0,0 +1,131 @@
+import os
+import numpy as np
+from shared.config import Config
+
+ANOMALY_STATE_FILE = 'anomaly_baseline.npz'
+
+class AnomalyDetector:
+    """Per-worker EWMA baseline of the hash rate, flags workers whose hash rate stays well below it.
+
+    The baseline mean and variance live in arrays indexed by the store's worker
+    id, so a poll is evaluated in one vectorized pass over its sample records.
+    A sample deviates when it is more than drop below the mean and more than
+    z_score standard deviations below it; a worker is flagged once it has
+    deviated for hold_seconds and cleared once it has not for as long.
+    Deviating samples are kept out of the baseline, so a failing worker cannot
+    drag its own baseline down; a worker still deviating relearn_seconds after
+    it was flagged has its baseline re-seeded at the new level instead, so a rig
+    set up to hash lower is cleared after warming up again. Disconnected and
+    zero hash rate samples are left to the existing alerts and keep the worker's
+    flag as it was, so an outage in the middle of a drop does not alert twice.
+    """
+
+    def __init__(self, state_file, alpha=0.05, drop=0.25, z_score=3.0, hold_seconds=600, warmup=30, relearn_seconds=86400):
+        self.state_file = state_file
+        self.alpha = alpha
+        self.drop = drop
+        self.z_score = z_score
+        self.hold = hold_seconds
+        self.warmup = warmup
+        self.relearn = relearn_seconds
+        self.mean = np.zeros(0)
+        self.var = np.zeros(0)
+        self.count = np.zeros(0, dtype=np.int64)
+        self.flagged = np.zeros(0, dtype=bool)
+        self.flagged_since = np.zeros(0)
+        # Since when the worker has been deviating while not flagged, or normal while flagged; nan otherwise
+        self.changing_since = np.zeros(0)
+
+    # Function to make the arrays long enough for worker id max_id
+    def _grow(self, max_id):
+        missing = max_id + 1 - len(self.mean)
+        if missing > 0:
+            self.mean = np.concatenate([self.mean, np.zeros(missing)])
+            self.var = np.concatenate([self.var, np.zeros(missing)])
+            self.count = np.concatenate([self.count, np.zeros(missing, dtype=np.int64)])
+            self.flagged = np.concatenate([self.flagged, np.zeros(missing, dtype=bool)])
+            self.flagged_since = np.concatenate([self.flagged_since, np.full(missing, np.nan)])
+            self.changing_since = np.concatenate([self.changing_since, np.full(missing, np.nan)])
+
+    def evaluate(self, timestamp, records):
+        """Fold in the sample records of the snapshot taken at timestamp.
+
+        Returns (degraded, restored), lists of (worker id, hash rate, baseline) for the workers flagged and cleared.
+        """
+        if len(records) == 0:
+            return [], []
+        ids = records['worker'].astype(np.intp)
+        self._grow(int(ids.max()))
+        rate = records['hash_rate']
+        up = records['connected'].astype(bool) & (rate > 0)
+
+        # A worker that is down keeps its flag, only a pending change starts over
+        self.changing_since[ids[~up]] = np.nan
+        ids = ids[up]
+        rate = rate[up]
+
+        # Flagged for relearn seconds: take the current level as the new baseline and warm up again
+        relearn = ids[self.flagged[ids] & (timestamp - self.flagged_since[ids] >= self.relearn)]
+        self.count[relearn] = 0
+        # Only once per flag, the worker is cleared through the hold-down once its new baseline is warm
+        self.flagged_since[relearn] = np.nan
+
+        mean = self.mean[ids]
+        deviating = ((self.count[ids] >= self.warmup) & (rate < mean * (1 - self.drop))
+                     & (mean - rate > self.z_score * np.sqrt(self.var[ids])))
+
+        # EWMA update of the mean and variance from the samples that do not deviate
+        normal = ids[~deviating]
+        sample = rate[~deviating]
+        delta = sample - self.mean[normal]
+        increment = self.alpha * delta
+        first = self.count[normal] == 0
+        self.mean[normal] = np.where(first, sample, self.mean[normal] + increment)
+        self.var[normal] = np.where(first, 0.0, (1 - self.alpha) * (self.var[normal] + delta * increment))
+        self.count[normal] += 1
+
+        # Hold-down: flip the flag once the worker has been in the other condition for hold seconds
+        flagged = self.flagged[ids]
+        since = self.changing_since[ids]
+        changing = deviating != flagged
+        since[~changing] = np.nan
+        since[changing & np.isnan(since)] = timestamp
+        flip = changing & (timestamp - since >= self.hold)
+        since[flip] = np.nan
+        self.changing_since[ids] = since
+        self.flagged[ids[flip]] = deviating[flip]
+        self.flagged_since[ids[flip]] = np.where(deviating[flip], timestamp, np.nan)
+
+        degraded = flip & deviating
+        restored = flip & ~deviating
+        return (list(zip(ids[degraded].tolist(), rate[degraded].tolist(), self.mean[ids[degraded]].tolist())),
+                list(zip(ids[restored].tolist(), rate[restored].tolist(), self.mean[ids[restored]].tolist())))
+
+    def load(self):
+        try:
+            with np.load(self.state_file) as state:
+                arrays = [state[name] for name in ('mean', 'var', 'count', 'flagged', 'flagged_since', 'changing_since')]
+        except (OSError, KeyError, ValueError):
+            # No or an unreadable baseline, every worker warms up again
+            return
+        self.mean, self.var, self.count, self.flagged, self.flagged_since, self.changing_since = arrays
+
+    def save(self):
+        tmp_file = self.state_file + '.tmp'
+        with open(tmp_file, 'wb') as f:
+            np.savez(f, mean=self.mean, var=self.var, count=self.count, flagged=self.flagged,
+                     flagged_since=self.flagged_since, changing_since=self.changing_since)
+        os.replace(tmp_file, self.state_file)
+
+# Function to get the AnomalyDetector arguments from the config, None when anomaly-drop disables detection
+def anomaly_settings(config: Config):
+    if not config.anomaly_drop:
+        return None
+    return {
+        'alpha': config.anomaly_alpha,
+        'drop': config.anomaly_drop,
+        'z_score': config.anomaly_z_score,
+        'hold_seconds': config.anomaly_hold_minutes * 60,
+        'warmup': config.anomaly_warmup_polls,
+        'relearn_seconds': config.anomaly_relearn_hours * 3600,
+    }
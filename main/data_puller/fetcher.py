@@ -0,0 +1,72 @@
+import asyncio
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from shared.metrics import REGISTRY
+
+request_seconds = REGISTRY.histogram('litepool_api_request_seconds', 'Time of one pool API request', ['account'])
+request_retries = REGISTRY.counter('litepool_api_retries_total', 'Pool API requests that were retried', ['account'])
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+class FetchError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f'status code: {status_code}')
+        self.status_code = status_code
+
+class PoolFetcher:
+    """Fetches every account's API snapshot concurrently over one pooled keep-alive session.
+
+    requests is blocking, so each GET runs on a bounded thread pool driven by
+    asyncio; the semaphore caps in-flight requests at max_concurrency and
+    failed requests are retried with exponential backoff.
+    """
+
+    def __init__(self, max_concurrency=4, timeout=10, retries=3, backoff=1.0):
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_concurrency, pool_maxsize=max_concurrency)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='fetch')
+
+    def _get(self, url):
+        response = self.session.get(url, timeout=self.timeout)
+        if response.status_code == 200:
+            return response.json()
+        raise FetchError(response.status_code)
+
+    async def fetch(self, semaphore, account):
+        """Returns the decoded snapshot for account, or the exception of the last attempt."""
+        loop = asyncio.get_running_loop()
+        error = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                request_retries.inc(account=account.name)
+                await asyncio.sleep(self.backoff * 2 ** (attempt - 1))
+            async with semaphore:
+                try:
+                    with request_seconds.time(account=account.name):
+                        return await loop.run_in_executor(self.executor, self._get, account.request_url)
+                except FetchError as e:
+                    error = e
+                    if e.status_code not in RETRY_STATUS_CODES:
+                        break
+                except (requests.RequestException, ValueError) as e:
+                    error = e
+        return error
+
+    async def _fetch_all(self, accounts):
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        return await asyncio.gather(*(self.fetch(semaphore, account) for account in accounts))
+
+    def fetch_all(self, accounts):
+        """Returns a list of (account, snapshot or exception) in the order given."""
+        return list(zip(accounts, asyncio.run(self._fetch_all(accounts))))
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+        self.session.close()
@@ -1,10 +1,12 @@
 import os
 import json
-import pandas as pd
-import matplotlib.pyplot as plt
-from datetime import datetime, timedelta
-import re
-from PIL import Image, ImageDraw, ImageFont
+import time
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from shared.timeseries import SampleStore
+from shared.chart_manifest import CHART_DATA_FILE, fingerprint, load_manifest, save_manifest
+from shared.metrics import REGISTRY
+from .aggregator import HourlyAggregator
 
 # Define the data folder path
 app_path = os.path.dirname(os.path.abspath(__file__))
@@ -12,47 +14,14 @@ app_path = os.path.dirname(os.path.abspath(__file__))
 data_folder = os.path.join(app_path, '..', 'data')
 charts_folder = os.path.join(app_path, '..', 'webserver', 'static')
 
-# Function to parse JSON files
-def parse_json_files(data_folder):
-    json_files = [f for f in os.listdir(data_folder) if f.endswith('.json')]
-    data = []
-    datetime_pattern = re.compile(r'^\d{4}-\d{2}-\d{2}_\d{2}\.\d{2}\.\d{2}\.json$')
-
-    for file in json_files:
-        if datetime_pattern.match(file):
-            try:
-                file_datetime = datetime.strptime(file, '%Y-%m-%d_%H.%M.%S.json')
-                with open(os.path.join(data_folder, file), 'r') as f:
-                    json_data = json.load(f)
-                    json_data['filename'] = file  # Add filename to json data
-                    data.append(json_data)
-            except ValueError:
-                continue  # Skip files that do not match the date-time format
-    return data
-
-# Function to process data
-def process_data(data) -> pd.DataFrame:
-    worker_stats = []
-
-    for entry in data:
-        # Extract timestamp from filename
-        timestamp_str = entry['filename'].replace('.json', '').replace('_', ' ').replace('.', ':')
-        timestamp = datetime.strptime(timestamp_str, '%Y-%m-%d %H:%M:%S')
-        
-        workers = entry.get('workers', {})
-
-        for worker, stats in workers.items():
-            worker_stats.append({
-                'timestamp': timestamp,
-                'worker': worker,
-                'connected': "Connected" if stats['connected'] else "Not Connected",
-                'hash_rate': stats['hash_rate']
-            })
-
-    return pd.DataFrame(worker_stats)
+render_seconds = REGISTRY.histogram('litepool_chart_render_seconds', 'Time to draw one chart', ['chart'])
+renders_skipped = REGISTRY.counter('litepool_chart_renders_skipped_total', 'Chart renders skipped because the data did not change', ['chart'])
+render_failures = REGISTRY.counter('litepool_chart_render_failures_total', 'Chart renders that raised', ['chart'])
 
 # Function to generate placeholder image
 def generate_placeholder_image(filename, message="Insufficient Data Available"):
+    from PIL import Image, ImageDraw, ImageFont
+
     width, height = 800, 600
     image = Image.new('RGB', (width, height), color=(73, 109, 137))
     draw = ImageDraw.Draw(image)
@@ -71,96 +40,202 @@ def generate_placeholder_image(filename, message="Insufficient Data Available"):
     text_y = (height - text_height) / 2
     draw.text((text_x, text_y), message, font=font, fill=(255, 255, 255))
 
-    image.save(filename)
-
-# Function to generate charts
-def generate_charts(worker_stats: pd.DataFrame):
-    # Convert timestamps to datetime
-    worker_stats['timestamp'] = pd.to_datetime(worker_stats['timestamp'])
-
-    # Ensure the static folder exists
-    if not os.path.exists(charts_folder):
-        os.makedirs(charts_folder)
+    # Written like the figures, to a temp file renamed over the chart
+    tmp_file = filename + '.tmp'
+    image.save(tmp_file, format='PNG')
+    os.replace(tmp_file, filename)
+
+# matplotlib and PIL are imported inside the functions that draw, so the puller only loads them once a chart is drawn
+
+# Function to set up a render process, charts are drawn off-screen with the object-oriented Figure API
+def init_render_process():
+    import matplotlib
+    matplotlib.use('Agg')
+
+# Function to create the pool of processes the charts are drawn in
+def create_render_pool(processes=2):
+    # spawn, not fork, since the puller forks from a process with running threads
+    return ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn'),
+                               initializer=init_render_process)
+
+# Function to run a draw function and return how long it took, so charts drawn in the pool are timed where they are drawn
+def timed_draw(draw, *args):
+    start = time.perf_counter()
+    draw(*args)
+    return time.perf_counter() - start
+
+# Function to write a figure to a temp file and rename it over filepath, so a half-written chart is never served
+def save_figure(figure, filepath):
+    tmp_file = filepath + '.tmp'
+    figure.savefig(tmp_file, format='png')
+    os.replace(tmp_file, filepath)
+
+def draw_uptime_pie_chart(uptime_counts, filepath):
+    from matplotlib.figure import Figure
+
+    figure = Figure(figsize=(8, 6))
+    axes = figure.subplots()
+    axes.pie(uptime_counts, labels=uptime_counts.index, autopct='%1.1f%%', startangle=140)
+    axes.set_title('Worker Uptime')
+    save_figure(figure, filepath)
+
+def draw_workers_connected_bar_chart(workers_connected, total_workers, filepath):
+    from matplotlib.figure import Figure
+
+    figure = Figure(figsize=(10, 6))
+    axes = figure.subplots()
+    positions = range(len(workers_connected))
+    axes.bar(positions, workers_connected.values)
+    axes.set_xticks(positions, [str(hour) for hour in workers_connected.index], rotation=45)
+    axes.set_xlabel('Time (Hourly)')
+    axes.set_ylabel('Number of Workers Connected')
+    axes.set_title('Number of Workers Connected')
+    axes.set_ylim(0, total_workers)  # Set y-axis limit to the total number of workers
+    figure.tight_layout()  # Ensure the x-labels fit into the plot
+    save_figure(figure, filepath)
+
+def draw_hashrate_line_graph(hashrate_stats, filepath):
+    from matplotlib.figure import Figure
+
+    figure = Figure(figsize=(12, 8))
+    axes = figure.subplots()
+    axes.plot(hashrate_stats.index, hashrate_stats['mean'], label='Average Hashrate')
+    axes.plot(hashrate_stats.index, hashrate_stats['max'], label='Max Hashrate')
+    axes.plot(hashrate_stats.index, hashrate_stats['min'], label='Min Hashrate')
+    axes.set_xlabel('Hour')
+    axes.set_ylabel('Hashrate')
+    axes.set_title('Hashrate Statistics Over Last 24 Hours')
+    axes.legend()
+    save_figure(figure, filepath)
+
+# Function to build the columns the browser draws the charts from, rounded to what a chart can show
+def chart_payload(aggregator: HourlyAggregator):
+    columns = aggregator.hourly_columns()
+    connected, disconnected = aggregator.uptime_totals()
+    return {
+        'hours': columns['hours'].tolist(),
+        'connected': columns['connected'].round(2).tolist(),
+        'mean': columns['mean'].round(2).tolist(),
+        'max': columns['max'].round(2).tolist(),
+        'min': columns['min'].round(2).tolist(),
+        'total_workers': aggregator.total_workers(),
+        'uptime': {'connected': connected, 'disconnected': disconnected},
+    }
+
+# Function to write the chart payload like a figure, to a temp file renamed over filepath
+def write_chart_data(payload, filepath):
+    tmp_file = filepath + '.tmp'
+    with open(tmp_file, 'w') as f:
+        json.dump(payload, f, separators=(',', ':'))
+    os.replace(tmp_file, filepath)
+
+# Function to work out what each chart would show, returns (filename, data hash, draw function, arguments) per chart
+def chart_jobs(aggregator: HourlyAggregator, mode='png'):
+    # The payload is a few KB and always published, so the webserver can switch modes without the puller
+    payload = chart_payload(aggregator)
+    jobs = [(CHART_DATA_FILE, fingerprint('data', payload), write_chart_data, (payload,))]
+    if mode == 'client':
+        return jobs
 
     # Pie chart for worker uptime
-    uptime_counts = worker_stats['connected'].value_counts()
+    uptime_counts = aggregator.uptime_counts()
     
     if not uptime_counts.empty:
-        plt.figure(figsize=(8, 6))
-        plt.pie(uptime_counts, labels=uptime_counts.index, autopct='%1.1f%%', startangle=140)
-        plt.title('Worker Uptime')
-        plt.savefig(os.path.join(charts_folder, 'worker_uptime_pie_chart.png'))
-        plt.close()
+        # Hash what the chart shows (shares to 0.1%) so count changes that do not move the slices skip the render
+        data_hash = fingerprint('pie', (uptime_counts / uptime_counts.sum() * 100).round(1).to_dict())
+        jobs.append(('worker_uptime_pie_chart.png', data_hash, draw_uptime_pie_chart, (uptime_counts,)))
     else:
-        generate_placeholder_image(os.path.join(charts_folder, 'worker_uptime_pie_chart.png'))
+        jobs.append(('worker_uptime_pie_chart.png', fingerprint('placeholder'), generate_placeholder_image, ()))
+
+    # Hourly buckets for the last 24 hours, all hours present
+    hourly_stats = aggregator.hourly_frame()
 
     # Bar chart for number of workers connected
-    total_workers = worker_stats['worker'].nunique()
-    hourly_stats = worker_stats.groupby([worker_stats['timestamp'].dt.floor('h'), 'connected'])['worker'].count().unstack(fill_value=0)
-    
-    workers_connected = hourly_stats['Connected'] if 'Connected' in hourly_stats.columns else pd.Series(0, index=hourly_stats.index)
+    total_workers = aggregator.total_workers()
+    workers_connected = hourly_stats['connected']
 
-    # Ensure all hours are present in the index
     if not workers_connected.empty:
-        all_hours = pd.date_range(start=workers_connected.index.min(), end=workers_connected.index.max(), freq='h')
-        workers_connected = workers_connected.reindex(all_hours, fill_value=0)
-
-        
-        plt.figure(figsize=(10, 6))
-        workers_connected.plot(kind='bar')
-        plt.xlabel('Time (Hourly)')
-        plt.ylabel('Number of Workers Connected')
-        plt.title('Number of Workers Connected')
-        plt.ylim(0, total_workers)  # Set y-axis limit to the total number of workers
-        plt.xticks(rotation=45)
-        plt.tight_layout()  # Ensure the x-labels fit into the plot
-        plt.savefig(os.path.join(charts_folder, 'workers_connected_bar_chart.png'))
-        plt.close()
+        data_hash = fingerprint('bar', total_workers, workers_connected.round(2).to_json())
+        jobs.append(('workers_connected_bar_chart.png', data_hash, draw_workers_connected_bar_chart, (workers_connected, total_workers)))
     else:
-        generate_placeholder_image(os.path.join(charts_folder, 'workers_connected_bar_chart.png'))
+        jobs.append(('workers_connected_bar_chart.png', fingerprint('placeholder'), generate_placeholder_image, ()))
 
     # Line graph for average, max, and min hashrate over 24 hours
-    now = datetime.now()
-    last_24_hours = now - timedelta(hours=24)
-    hashrate_stats = worker_stats[worker_stats['timestamp'] > last_24_hours]
-    
-    # Group by hour and calculate statistics
-    hashrate_stats = hashrate_stats.groupby(pd.Grouper(key='timestamp', freq='h'))['hash_rate'].agg(['mean', 'max', 'min'])
+    hashrate_stats = hourly_stats[['mean', 'max', 'min']]
 
-    # Ensure all hours are present in the index
     if not hashrate_stats.empty:
-        all_hours = pd.date_range(start=hashrate_stats.index.min(), end=hashrate_stats.index.max(), freq='h')
-        hashrate_stats = hashrate_stats.reindex(all_hours, fill_value=0)
-
-        # Fill NaN values with zeros
-        hashrate_stats = hashrate_stats.fillna(0)
-
-        
-
-        if not hashrate_stats.empty:
-            plt.figure(figsize=(12, 8))
-            hashrate_stats['mean'].plot(label='Average Hashrate')
-            hashrate_stats['max'].plot(label='Max Hashrate')
-            hashrate_stats['min'].plot(label='Min Hashrate')
-            plt.xlabel('Hour')
-            plt.ylabel('Hashrate')
-            plt.title('Hashrate Statistics Over Last 24 Hours')
-            plt.legend()
-            plt.savefig(os.path.join(charts_folder, 'hashrate_stats_line_graph.png'))
-            plt.close()
-        else:
-            generate_placeholder_image(os.path.join(charts_folder, 'hashrate_stats_line_graph.png'))
+        data_hash = fingerprint('line', hashrate_stats.round(2).to_json())
+        jobs.append(('hashrate_stats_line_graph.png', data_hash, draw_hashrate_line_graph, (hashrate_stats,)))
     else:
-        generate_placeholder_image(os.path.join(charts_folder, 'hashrate_stats_line_graph.png'))
+        jobs.append(('hashrate_stats_line_graph.png', fingerprint('placeholder'), generate_placeholder_image, ()))
+    return jobs
 
-def parse_data_generate_charts():
-    data = parse_json_files(data_folder)
-    worker_stats = process_data(data)
+# Function to draw the charts whose data changed, one job per chart on executor (inline without one), returns the names of the charts that were redrawn
+def render_jobs(jobs, folder, executor=None):
+    # Ensure the static folder exists
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+
+    manifest = load_manifest(folder)
+    pending = []
+    for filename, data_hash, draw, args in jobs:
+        filepath = os.path.join(folder, filename)
+        entry = manifest.get(filename)
+        if entry and entry['hash'] == data_hash and os.path.exists(filepath):
+            renders_skipped.inc(chart=filename)
+            continue
+        if draw is generate_placeholder_image:
+            args = (filepath,)
+        else:
+            args = args + (filepath,)
+        # Writing the payload is cheaper than handing it to the pool
+        if executor is None or draw is write_chart_data:
+            try:
+                result = timed_draw(draw, *args)
+            except Exception as e:
+                result = e
+        else:
+            result = executor.submit(timed_draw, draw, *args)
+        pending.append((filename, data_hash, result))
+
+    rendered = []
+    error = None
+    for filename, data_hash, result in pending:
+        try:
+            if isinstance(result, Exception):
+                raise result
+            elapsed = result.result() if isinstance(result, Future) else result
+        except Exception as e:
+            # Leave the old chart and its manifest entry, the next cycle tries again
+            render_failures.inc(chart=filename)
+            error = error or e
+            continue
+        render_seconds.observe(elapsed, chart=filename)
+        manifest[filename] = {'hash': data_hash, 'updated': time.time()}
+        rendered.append(filename)
+
+    if rendered:
+        save_manifest(folder, manifest)
+    if error:
+        raise error
+    return rendered
+
+# Function to generate charts, returns the names of the charts that were redrawn
+def generate_charts(aggregator: HourlyAggregator, folder=None, executor=None, mode='png'):
+    if folder is None:
+        folder = charts_folder
+    return render_jobs(chart_jobs(aggregator, mode), folder, executor)
+
+# Function to load the aggregated state and regenerate the charts
+def parse_data_generate_charts(store: SampleStore, aggregator: HourlyAggregator = None, folder=None, executor=None):
+    if aggregator is None:
+        aggregator = HourlyAggregator(os.path.join(data_folder, 'hourly_aggregates.json'))
+        aggregator.load(store, time.time())
     
-    generate_charts(worker_stats)
+    return generate_charts(aggregator, folder, executor)
 
 def main():
-    parse_data_generate_charts()
+    parse_data_generate_charts(SampleStore(os.path.join(data_folder, 'samples')))
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
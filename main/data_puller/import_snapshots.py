@@ -0,0 +1,23 @@
+import os
+import sys
+import logging as baselogging
+from shared.mylogging import logging
+from shared.config import get_config
+from shared.rollups import RollupManager
+from shared.timeseries import SampleStore, import_json_snapshots
+
+# One-shot import of the legacy YYYY-mm-dd_HH.MM.SS.json snapshots into the sample store.
+# Pass --remove to delete each snapshot file once this run has imported it.
+def main():
+    logging.configure('import_snapshots')
+    logger = logging.get_logger(loglevel=baselogging.DEBUG, loggername=__name__)
+
+    app_path = os.path.dirname(os.path.abspath(__file__))
+    data_folder = os.path.join(app_path, '..', 'data')
+    store = SampleStore(os.path.join(data_folder, 'samples'))
+    # Older history than the puller's watermarks goes straight into the rollups, the raw samples only last a day
+    rollups = RollupManager(store, get_config().rollup_retention_days)
+    import_json_snapshots(store, data_folder, logger=logger, remove='--remove' in sys.argv[1:], rollups=rollups)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import os
+import sys
+import json
+import time
+import argparse
+import logging as baselogging
+from datetime import datetime
+from shared.mylogging import logging
+from shared.archive import SnapshotArchive, archive_folder
+from shared.chart_manifest import CHART_MODES
+from shared.config import get_config
+from .accounts import Account, AccountPipeline, DEFAULT_ACCOUNT, account_data_folder
+from .anomalies import anomaly_settings
+from .update_data import aggregate_snapshot, render_charts
+
+app_path = os.path.dirname(os.path.abspath(__file__))
+data_folder = os.path.join(app_path, '..', 'data')
+
+class RecordingAlerts:
+    """Stands in for the AlertDispatcher: alerts are written to a JSON lines file instead of being sent."""
+
+    def __init__(self, path):
+        self.file = open(path, 'w')
+        self.count = 0
+        # The snapshot being replayed, so alerts carry the time they would have gone out
+        self.timestamp = None
+
+    def notify(self, kind, subject, plain_body, html_body):
+        self.count += 1
+        self.file.write(json.dumps({'ts': self.timestamp, 'kind': kind, 'subject': subject, 'body': plain_body}) + '\n')
+
+    def close(self):
+        self.file.close()
+
+# Function to parse a --from/--to value given as unix seconds or ISO 8601
+def parse_time(value):
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+# Function to stream an account's archived snapshots through the pipeline into a fresh data folder, returns a summary
+def replay(archive: SnapshotArchive, pipeline: AccountPipeline, alerts: RecordingAlerts, logger, start=None, end=None, chart_mode=None):
+    snapshots = 0
+    samples = 0
+    started = time.perf_counter()
+    for timestamp, data in archive.read(start, end):
+        alerts.timestamp = timestamp
+        records = pipeline.store.append(timestamp, data.get('workers', {}))
+        aggregate_snapshot(logger, pipeline, timestamp, data, records, alerts)
+        snapshots += 1
+        samples += len(records)
+    pipeline.worker_state.save(force=True)
+    if chart_mode and snapshots:
+        render_charts(pipeline, None, chart_mode)
+    elapsed = time.perf_counter() - started
+    return {
+        'snapshots': snapshots,
+        'samples': samples,
+        'alerts': alerts.count,
+        'seconds': elapsed,
+        'snapshots_per_second': snapshots / elapsed if elapsed else None,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m data_puller.replay',
+                                     description='Replay archived snapshots through the puller pipeline, with alerts recorded instead of sent.')
+    parser.add_argument('--from', dest='start', type=parse_time, help='first snapshot time, unix seconds or ISO 8601 (default: the oldest archived)')
+    parser.add_argument('--to', dest='end', type=parse_time, help='replay snapshots before this time (default: all)')
+    parser.add_argument('--account', default=DEFAULT_ACCOUNT, help=f'account whose archive is replayed (default {DEFAULT_ACCOUNT})')
+    parser.add_argument('--charts', choices=[*CHART_MODES, 'none'], default='none', help='draw the charts at the end of the replay (default none)')
+    parser.add_argument('--output', help='folder the replay writes its data to (default data/replay/<timestamp>), must not hold live data')
+    args = parser.parse_args(argv)
+
+    logging.configure('replay')
+    logger = logging.get_logger(loglevel=baselogging.ERROR, loggername=__name__)
+
+    archive = SnapshotArchive(archive_folder(account_data_folder(data_folder, args.account)))
+    output = args.output or os.path.join(data_folder, 'replay', datetime.now().strftime('%Y-%m-%d_%H.%M.%S'))
+    if os.path.exists(output) and os.listdir(output):
+        print(f"{output} is not empty, replay into a new folder")
+        return 1
+
+    # A pipeline of its own, so the live store, worker state and charts are never touched
+    account = Account(DEFAULT_ACCOUNT, '', '')
+    pipeline = AccountPipeline(account, output, os.path.join(output, 'charts'), anomaly_settings=anomaly_settings(get_config()))
+    alerts = RecordingAlerts(os.path.join(output, 'alerts.jsonl'))
+    try:
+        summary = replay(archive, pipeline, alerts, logger, args.start, args.end,
+                         None if args.charts == 'none' else args.charts)
+    finally:
+        alerts.close()
+
+    with open(os.path.join(output, 'replay.json'), 'w') as f:
+        json.dump({'account': args.account, 'from': args.start, 'to': args.end, **summary}, f, indent=2)
+    print(f"Replayed {summary['snapshots']} snapshots ({summary['samples']} samples) in {summary['seconds']:.1f}s, "
+          f"{summary['alerts']} alerts, results in {output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+import json
+import math
+import time
+import threading
+from collections import OrderedDict, deque
+from shared.config import MIN_POLL_INTERVAL
+from shared.metrics import REGISTRY
+
+ticks_missed = REGISTRY.counter('litepool_ticks_missed_total', 'Poll ticks that did not produce a sample', ['cause'])
+stage_backlog = REGISTRY.gauge('litepool_stage_backlog', 'Jobs waiting in a pipeline stage', ['stage'])
+stage_seconds = REGISTRY.histogram('litepool_stage_job_seconds', 'Time of one job in a pipeline stage', ['stage'])
+
+class MissedTickLog:
+    """Append-only JSON lines record of ticks that did not produce a sample."""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def record(self, tick, reason, account=None):
+        # Reasons carry the error text, only the part before it is used as a label
+        ticks_missed.inc(cause=reason.split(':')[0])
+        entry = {'tick': tick, 'time': time.time(), 'reason': reason}
+        if account is not None:
+            entry['account'] = account
+        with self.lock:
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(entry) + '\n')
+
+class Scheduler:
+    """Fixed-rate ticks on wall clock multiples of interval (:00, :10, :20 ... for 10s).
+
+    Each tick's target time is computed from the previous target, not from when
+    the job finished, so job duration never makes the schedule drift. A job that
+    overruns its slot delays the next tick by at most half an interval; ticks
+    later than that are skipped and recorded in the missed tick log.
+    """
+
+    def __init__(self, interval, logger, missed_ticks: MissedTickLog):
+        if interval < MIN_POLL_INTERVAL:
+            raise ValueError(f"Poll interval must be at least {MIN_POLL_INTERVAL} seconds, got {interval}")
+        self.interval = interval
+        self.logger = logger
+        self.missed_ticks = missed_ticks
+
+    def first_tick(self, now):
+        return math.ceil(now / self.interval) * self.interval
+
+    def run(self, job):
+        tick = self.first_tick(time.time())
+        while True:
+            delay = tick - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            job(tick)
+            tick = self.next_tick(tick, time.time())
+
+    def next_tick(self, tick, now):
+        next_tick = tick + self.interval
+        late = now - next_tick
+        if late > self.interval / 2:
+            missed = math.ceil((late - self.interval / 2) / self.interval)
+            for i in range(missed):
+                self.missed_ticks.record(next_tick + i * self.interval, 'previous tick overran')
+            self.logger.error(f"Poll overran, skipped {missed} tick(s)")
+            next_tick += missed * self.interval
+        return next_tick
+
+class Stage:
+    """A pipeline stage with its own thread, so slow work never holds up the stage before it.
+
+    Jobs run in submission order. With coalesce=True a job submitted under a key
+    that is still waiting replaces the waiting one, so a slow stage only ever
+    works on the latest input.
+    """
+
+    def __init__(self, name, logger, coalesce=False):
+        self.name = name
+        self.logger = logger
+        self.coalesce = coalesce
+        self.pending = OrderedDict() if coalesce else deque()
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self.thread.start()
+
+    def submit(self, key, fn, *args):
+        with self.condition:
+            if self.coalesce:
+                self.pending[key] = (fn, args)
+            else:
+                self.pending.append((fn, args))
+            self.condition.notify()
+
+    def backlog(self):
+        with self.condition:
+            backlog = len(self.pending)
+        stage_backlog.set(backlog, stage=self.name)
+        return backlog
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.pending:
+                    self.condition.wait()
+                if self.coalesce:
+                    _, (fn, args) = self.pending.popitem(last=False)
+                else:
+                    fn, args = self.pending.popleft()
+            try:
+                with stage_seconds.time(stage=self.name):
+                    fn(*args)
+            except Exception as e:
+                self.logger.error(f"Exception in {self.name} stage: {str(e)}")
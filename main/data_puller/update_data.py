@@ -1,161 +1,207 @@
 import os
-import requests
-import json
-from datetime import datetime, timedelta
+from datetime import datetime
 import time
 import logging as baselogging
 from shared.mylogging import logging
-from .generate_charts import parse_data_generate_charts
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from shared import load_secrets
+from .generate_charts import chart_jobs, create_render_pool, render_jobs, charts_folder
+from .accounts import DEFAULT_ACCOUNT, AccountPipeline, load_accounts
+from .anomalies import anomaly_settings
+from .fetcher import PoolFetcher
+from .scheduler import MissedTickLog, Scheduler, Stage
+from .alerts import AlertDispatcher, create_sink, send_message
+from shared.config import get_config, install_reload_signal
+from shared.timeseries import SampleStore
+from shared.transitions import CONNECTED, RECOVERED, DEGRADED, worker_state_name
+from shared.rollups import RAW_RETENTION
+from shared.worker_state import WorkerState
+from shared.metrics import REGISTRY, TEXTFILE
 
-# Function to send email notifications
+fetch_seconds = REGISTRY.histogram('litepool_api_fetch_seconds', 'Time to fetch every account from the pool API')
+fetch_failures = REGISTRY.counter('litepool_api_fetch_failures_total', 'Account fetches that failed after retries', ['account'])
+snapshot_write_seconds = REGISTRY.histogram('litepool_snapshot_write_seconds', 'Time to append one snapshot to the sample store', ['account'])
+samples_written = REGISTRY.counter('litepool_samples_written_total', 'Worker samples appended to the sample store', ['account'])
+aggregate_seconds = REGISTRY.histogram('litepool_aggregate_seconds', 'Time to fold a snapshot into the aggregates, worker state and rollups', ['account'])
+process_workers_seconds = REGISTRY.histogram('litepool_process_workers_seconds', 'Time to update the worker state and raise alerts for a snapshot')
+anomaly_seconds = REGISTRY.histogram('litepool_anomaly_seconds', 'Time to check a snapshot for hash rate drops', ['account'])
+archive_write_seconds = REGISTRY.histogram('litepool_archive_write_seconds', 'Time to compress and archive one snapshot', ['account'])
+archive_bytes = REGISTRY.counter('litepool_archive_bytes_total', 'Compressed snapshot bytes archived', ['account'])
+dashboard_publish_seconds = REGISTRY.histogram('litepool_dashboard_publish_seconds', 'Time to publish the dashboard snapshot the webserver maps', ['account'])
+history_write_seconds = REGISTRY.histogram('litepool_history_write_seconds', 'Time to write a poll to the history database', ['account'])
+last_tick = REGISTRY.gauge('litepool_last_tick_timestamp_seconds', 'Scheduled time of the last poll tick')
+
+# Function to send an email notification right away, outside the alert dispatcher
 def send_email(subject, plain_body, html_body):
-    secrets = load_secrets()
-    smtp_server = secrets['smtp-server']
-    smtp_port = secrets['smtp-port']
-    smtp_user = secrets['smtp-user']
-    smtp_password = secrets['smtp-password']
-    smtp_use_ssl = secrets['smtp-use-ssl']
-    smtp_use_tls = secrets['smtp-use-tls']
-    to_emails = secrets["email-notifications"]
-
-    if not isinstance(to_emails, list) or not to_emails:
+    config = get_config()
+    logger = logging.get_logger(loglevel=baselogging.DEBUG, loggername=__name__)
+    to_emails = config.email_notifications
+
+    if not to_emails:
         print("No valid email addresses found to send emails to.")
         return
-    
-    try:
-        if smtp_server and smtp_port and smtp_user and smtp_password and to_emails:
-            with (smtplib.SMTP_SSL(smtp_server, smtp_port) if smtp_use_ssl else smtplib.SMTP(smtp_server, smtp_port)) as server:
-                server.login(smtp_user, smtp_password)
-                
-                if not smtp_use_ssl and smtp_use_tls:
-                    server.starttls()
-
-                for email in to_emails:
-                    msg = MIMEText(plain_body, 'plain')
-                    msg['Subject'] = subject
-                    msg['From'] = smtp_user
-                    msg['To'] = email
-                    msg['Reply-To'] = smtp_user
-                    msg['X-Mailer'] = 'Python smtplib'
-                    try:
-                        server.sendmail(smtp_user, email, msg.as_string())
-                    except smtplib.SMTPDataError as e:
-                        print(f"Failed to send email to {email}: {e}")
-                    except smtplib.SMTPRecipientsRefused as e:
-                        print(f"Recipient refused for {email}: {e}")
-                    except smtplib.SMTPException as e:
-                        print(f"SMTP error occurred for {email}: {e}")
-    except smtplib.SMTPException as e:
-        print(f"SMTP error occurred: {e}")
-
-# Function to check the most recent file and its timestamp
-def get_most_recent_file(data_folder):
-    date_files = []
-    for file in os.listdir(data_folder):
+
+    sink = create_sink(config, logger)
+    if sink:
         try:
-            file_datetime = datetime.strptime(file, '%Y-%m-%d_%H.%M.%S')
-            date_files.append((file, file_datetime))
-        except ValueError:
+            send_message(sink, to_emails, subject, plain_body, html_body)
+        finally:
+            sink.close()
+
+# Function to call the API for every account and save the snapshots, returns (pipeline, data, records) for those that got new data
+def call_api_and_save(logger, fetcher: PoolFetcher, pipelines, timestamp, missed_ticks: MissedTickLog = None):
+    saved = []
+    with fetch_seconds.time():
+        results = fetcher.fetch_all([pipeline.account for pipeline in pipelines])
+    for pipeline, (account, data) in zip(pipelines, results):
+        if isinstance(data, Exception):
+            logger.error(f'Failed to retrieve data from the API for account {account.name}: {data}')
+            fetch_failures.inc(account=account.name)
+            if missed_ticks:
+                missed_ticks.record(timestamp, f'fetch failed: {data}', account.name)
             continue
-    if date_files:
-        return max(date_files, key=lambda x: x[1])
-    return None, None
-
-# Function to call the API and save the JSON output
-def call_api_and_save(logger, data_folder, api_endpoint, api_key):
-    request_url = f'{api_endpoint}{api_key}'
-    response = requests.get(request_url)
-    if response.status_code == 200:
-        data = response.json()
-        filename = datetime.now().strftime('%Y-%m-%d_%H.%M.%S') + '.json'
-        filepath = os.path.join(data_folder, filename)
-        with open(filepath, 'w') as f:
-            json.dump(data, f)
-        logger.info(f'Saved JSON data to {filepath}')
-        process_workers(data, logger, data_folder)
-        return data
-    else:
-        logger.error(f'Failed to retrieve data from the API, status code: {response.status_code}')
-        return None
-
-# Function to get all JSON files with datetime names and their modification times
-def get_json_files(data_folder):
-    date_files = []
-    for file in os.listdir(data_folder):
-        if file.endswith('.json'):
-            try:
-                file_datetime = datetime.strptime(file, '%Y-%m-%d_%H.%M.%S.json')
-                date_files.append((file, file_datetime))
-            except ValueError:
-                continue
-    return date_files
-
-# Function to keep only the most recent files for the last 24 hours
-def delete_old_files(logger, data_folder):
-    date_files = get_json_files(data_folder)
-    now = datetime.now()
-    cutoff = now - timedelta(hours=24)
-    
-    recent_files = [file for file, file_datetime in date_files if file_datetime > cutoff]
-    
-    recent_files.sort(key=lambda x: x[1], reverse=True)
-    
-    for file, file_datetime in date_files:
-        if file_datetime <= cutoff:
-            os.remove(os.path.join(data_folder, file))
-            logger.info(f"Deleted old file: {file}")
+        with snapshot_write_seconds.time(account=account.name):
+            records = pipeline.store.append(timestamp, data.get('workers', {}))
+        samples_written.inc(len(records), account=account.name)
+        logger.info(f'Saved {len(records)} worker samples to {pipeline.store.folder}')
+        saved.append((pipeline, data, records))
+    return saved
 
-def process_workers(data, logger, data_folder):
-    summary_file = os.path.join(data_folder, 'workers_summary.json')
-    
-    if os.path.exists(summary_file):
-        with open(summary_file, 'r') as f:
-            summary_data = json.load(f)
-    else:
-        summary_data = {}
+# Function to fold a saved snapshot (the API data and its sample records) into an account's aggregates and worker summary
+def aggregate_snapshot(logger, pipeline: AccountPipeline, timestamp, data, records, alerts: AlertDispatcher):
+    with aggregate_seconds.time(account=pipeline.account.name):
+        with pipeline.lock:
+            pipeline.aggregator.fold(timestamp, records)
+            pipeline.aggregator.save()
+        if pipeline.archive:
+            with archive_write_seconds.time(account=pipeline.account.name):
+                archive_bytes.inc(pipeline.archive.append(timestamp, data), account=pipeline.account.name)
+        with process_workers_seconds.time():
+            transitions = process_workers(data, logger, pipeline.worker_state, alerts, timestamp, pipeline.account.name)
+        if pipeline.anomalies:
+            with anomaly_seconds.time(account=pipeline.account.name):
+                transitions += detect_anomalies(pipeline, records, alerts, timestamp)
+        with dashboard_publish_seconds.time(account=pipeline.account.name):
+            pipeline.dashboard.publish(pipeline.worker_state.snapshot()[1], timestamp)
+        if transitions:
+            pipeline.transitions.append(pipeline.store, timestamp, transitions)
+        if pipeline.history:
+            with history_write_seconds.time(account=pipeline.account.name):
+                pipeline.history.record_poll(pipeline.store, records, transitions, timestamp)
+                pipeline.history.prune(timestamp)
+        # Roll up before pruning so no raw sample is dropped before it was compacted
+        pipeline.rollups.compact(timestamp)
+        delete_old_files(logger, pipeline.store, timestamp)
+        if pipeline.archive:
+            for segment in pipeline.archive.prune(timestamp):
+                logger.info(f"Deleted archive segment: {segment}")
+
+# Function to redraw an account's charts from its aggregates, the drawing itself runs on executor
+def render_charts(pipeline: AccountPipeline, executor=None, mode='png'):
+    # Only the chart inputs need the lock, the aggregate stage can carry on while the charts are drawn
+    with pipeline.lock:
+        jobs = chart_jobs(pipeline.aggregator, mode)
+    return render_jobs(jobs, pipeline.charts_folder, executor)
 
+# Function to write the puller's metrics where the webserver's /metrics picks them up
+def write_metrics(data_folder, stages):
+    for stage in stages:
+        # backlog() refreshes the stage's gauge
+        stage.backlog()
+    REGISTRY.write_textfile(os.path.join(data_folder, TEXTFILE))
+
+# Function to keep only the raw samples for the 24 hours before now, older history lives in the rollups
+def delete_old_files(logger, store: SampleStore, now=None):
+    cutoff = (now or time.time()) - RAW_RETENTION
+    for file in store.prune(cutoff):
+        logger.info(f"Deleted old file: {file}")
+
+# Function to get a worker's name as alerts show it, prefixed with its account unless that is the default one
+def alert_worker_name(account_name, worker):
+    return worker if account_name == DEFAULT_ACCOUNT else f"{account_name}/{worker}"
+
+# Function to update the worker state and raise alerts, returns the (worker, state, alert subject or None) transitions
+def process_workers(data, logger, state: WorkerState, alerts: AlertDispatcher, timestamp=None, account_name=DEFAULT_ACCOUNT):
+    """timestamp is when the snapshot was taken, it dates the disconnects so a replay gives the same result."""
+    now = datetime.fromtimestamp(timestamp) if timestamp is not None else datetime.now()
     workers = data.get('workers', {})
+    transitions = []
     for worker, details in workers.items():
-        if worker not in summary_data:
-            summary_data[worker] = {'connected': details['connected'], 'hash_rate': details['hash_rate'], 'disconnected_since': None}
-        summary_data[worker]['hash_rate'] = details['hash_rate']
+        label = alert_worker_name(account_name, worker)
+        summary = state.get(worker)
+        current = worker_state_name(details)
+        if summary is None:
+            previous = None
+            summary = {'connected': details['connected'], 'hash_rate': details['hash_rate'], 'disconnected_since': None}
+        else:
+            previous = worker_state_name(summary)
+        subject = None
+        summary['hash_rate'] = details['hash_rate']
         if not details['connected']:
-            if summary_data[worker]['disconnected_since'] is None:
-                summary_data[worker]['disconnected_since'] = datetime.now().isoformat()
-                subject = f"Worker {worker} Disconnected"
-                plain_body = f"Worker {worker} has disconnected at {summary_data[worker]['disconnected_since']}."
+            if summary['disconnected_since'] is None:
+                summary['disconnected_since'] = now.isoformat()
+                subject = f"Worker {label} Disconnected"
+                plain_body = f"Worker {label} has disconnected at {summary['disconnected_since']}."
                 html_body = f"""
                 <html>
                 <body>
-                    <h2>Worker {worker} Disconnected</h2>
-                    <p>Worker {worker} has disconnected at {summary_data[worker]['disconnected_since']}.</p>
+                    <h2>Worker {label} Disconnected</h2>
+                    <p>Worker {label} has disconnected at {summary['disconnected_since']}.</p>
                 </body>
                 </html>
                 """
-                send_email(subject, plain_body, html_body)
+                alerts.notify('disconnected', subject, plain_body, html_body)
         elif details['hash_rate'] == 0:
-            if summary_data[worker]['disconnected_since'] is None:
-                summary_data[worker]['disconnected_since'] = datetime.now().isoformat()
-                subject = f"Worker {worker} :: 0 Hash Rate"
-                plain_body = f"Worker {worker} has 0 hash rate at {summary_data[worker]['disconnected_since']}."
+            if summary['disconnected_since'] is None:
+                summary['disconnected_since'] = now.isoformat()
+                subject = f"Worker {label} :: 0 Hash Rate"
+                plain_body = f"Worker {label} has 0 hash rate at {summary['disconnected_since']}."
                 html_body = f"""
                 <html>
                 <body>
-                    <h2>Worker {worker} has 0 Hash Rate</h2>
-                    <p>Worker {worker} has 0 hash rate at {summary_data[worker]['disconnected_since']}.</p>
+                    <h2>Worker {label} has 0 Hash Rate</h2>
+                    <p>Worker {label} has 0 hash rate at {summary['disconnected_since']}.</p>
                 </body>
                 </html>
                 """
-                send_email(subject, plain_body, html_body)
+                alerts.notify('with 0 hash rate', subject, plain_body, html_body)
         else:
-            summary_data[worker]['disconnected_since'] = None
-        summary_data[worker]["connected"] = details["connected"]
-    with open(summary_file, 'w') as f:
-        json.dump(summary_data, f)
+            summary['disconnected_since'] = None
+        if previous is None:
+            transitions.append((worker, current, subject))
+        elif current != previous:
+            transitions.append((worker, RECOVERED if current == CONNECTED else current, subject))
+        summary["connected"] = details["connected"]
+        state.update(worker, summary)
+    state.save()
+    return transitions
+
+# Function to check a snapshot's sample records for hash rate drops and raise alerts, returns the transitions like process_workers
+def detect_anomalies(pipeline: AccountPipeline, records, alerts: AlertDispatcher, timestamp):
+    degraded, restored = pipeline.anomalies.evaluate(timestamp, records)
+    pipeline.anomalies.save()
+    if not degraded and not restored:
+        return []
+    names = pipeline.store.worker_names()
+    at = datetime.fromtimestamp(timestamp).isoformat()
+    transitions = []
+    for worker_id, hash_rate, baseline in degraded:
+        worker = names[worker_id]
+        label = alert_worker_name(pipeline.account.name, worker)
+        subject = f"Worker {label} :: Hash Rate Dropped"
+        plain_body = f"Worker {label} has been hashing at {hash_rate:g} since {at}, well below its usual {baseline:g}."
+        html_body = f"""
+        <html>
+        <body>
+            <h2>Worker {label} Hash Rate Dropped</h2>
+            <p>Worker {label} has been hashing at {hash_rate:g} since {at}, well below its usual {baseline:g}.</p>
+        </body>
+        </html>
+        """
+        alerts.notify('with a dropped hash rate', subject, plain_body, html_body)
+        transitions.append((worker, DEGRADED, subject))
+    for worker_id, _, _ in restored:
+        transitions.append((names[worker_id], RECOVERED, None))
+    return transitions
+
 def _windows_enable_ANSI(std_id):
     """Enable Windows 10 cmd.exe ANSI VT Virtual Terminal Processing."""
     from ctypes import byref, POINTER, windll, WINFUNCTYPE
@@ -203,6 +249,7 @@ def _windows_enable_ANSI(std_id):
     return True
     
 def main():
+    logging.configure('data_puller')
     logger = logging.get_logger(loglevel=baselogging.DEBUG, loggername=__name__)
     
     app_path = os.path.dirname(os.path.abspath(__file__))
@@ -213,26 +260,61 @@ def main():
     except Exception:
         print("Failed to enable ANSI")
     try:
-        secrets = load_secrets()
-        
-        api_endpoint = secrets.get('api-endpoint')
-        api_key = secrets.get('api-key')
-
-        if api_key and api_endpoint:
-            logger.info("Got API Key from secrets.json")
-            while True:
-                most_recent_file, most_recent_datetime = get_most_recent_file(data_folder)
-                if most_recent_datetime is None or datetime.now() - most_recent_datetime > timedelta(minutes=1):
-                    try:
-                        logger.info("API Data out of date, retrieving updated JSON")
-                        call_api_and_save(logger, data_folder, api_endpoint, api_key)
-                        delete_old_files(logger, data_folder)
-                        parse_data_generate_charts()
-                    except Exception as e:
-                        logger.error(f"Exception: {str(e)}")
-                else:
-                    print('Most recent file is within the last minute, skipping API call')
-                time.sleep(60)
+        config = get_config()
+        install_reload_signal()
+
+        accounts = load_accounts(config)
+
+        if accounts:
+            logger.info(f"Got API Keys for {len(accounts)} account(s) from secrets.json")
+            pipelines = [AccountPipeline(account, data_folder, charts_folder, config.rollup_retention_days,
+                                         config.history_retention_days if config.history_backend == 'sqlite' else None,
+                                         config.archive_retention_days or None, anomaly_settings(config))
+                         for account in accounts]
+            fetcher = PoolFetcher(max_concurrency=config.api_max_concurrency,
+                                  timeout=config.api_timeout,
+                                  retries=config.api_retries)
+            alerts = AlertDispatcher(create_sink(config, logger), config.email_notifications,
+                                     logger, config.alert_coalesce_seconds)
+            missed_ticks = MissedTickLog(os.path.join(data_folder, 'missed_ticks.jsonl'))
+            scheduler = Scheduler(config.poll_interval, logger, missed_ticks)
+
+            # Fetch and persist run on the scheduler thread, the slower stages each get their own
+            aggregate_stage = Stage('aggregate', logger)
+            render_stage = Stage('render', logger, coalesce=True)
+            # In the client chart mode nothing is drawn here, so no render processes are started
+            render_pool = create_render_pool(config.render_processes) if config.chart_mode == 'png' else None
+
+            def render_and_publish(pipeline):
+                try:
+                    render_charts(pipeline, render_pool, config.chart_mode)
+                finally:
+                    write_metrics(data_folder, [aggregate_stage, render_stage])
+
+            def aggregate_and_render(pipeline, tick, data, records):
+                try:
+                    aggregate_snapshot(logger, pipeline, tick, data, records, alerts)
+                except Exception as e:
+                    # Every account is its own job, the other accounts' snapshots are still aggregated
+                    logger.error(f"Failed to aggregate the snapshot of account {pipeline.account.name}: {str(e)}")
+                    missed_ticks.record(tick, f'aggregate failed: {str(e)}', pipeline.account.name)
+                    return
+                render_stage.submit(pipeline.account.name, render_and_publish, pipeline)
+
+            def poll(tick):
+                logger.info("Retrieving updated JSON")
+                last_tick.set(tick)
+                try:
+                    saved = call_api_and_save(logger, fetcher, pipelines, tick, missed_ticks)
+                except Exception as e:
+                    logger.error(f"Exception: {str(e)}")
+                    missed_ticks.record(tick, f'exception: {str(e)}')
+                    return
+                for pipeline, data, records in saved:
+                    aggregate_stage.submit(pipeline.account.name, aggregate_and_render, pipeline, tick, data, records)
+                write_metrics(data_folder, [aggregate_stage, render_stage])
+
+            scheduler.run(poll)
     except KeyboardInterrupt:
         logger.error("Program interrupted.")
     finally:
@@ -0,0 +1,3 @@
+call .env\Scripts\activate
+python -m benchmark %*
+deactivate
\ No newline at end of file
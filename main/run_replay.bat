@@ -0,0 +1,3 @@
+call .env\Scripts\activate
+python -m data_puller.replay %*
+deactivate
\ No newline at end of file
@@ -0,0 +1,83 @@
+import os
+import json
+import zlib
+import numpy as np
+from .timeseries import ChunkedTable, chunk_name, CHUNK_SECONDS
+
+# Where each snapshot's frame sits in its segment, 20 bytes per snapshot
+INDEX_DTYPE = np.dtype([
+    ('ts', '<f8'),
+    ('offset', '<u8'),
+    ('length', '<u4'),
+])
+
+SEGMENT_SUFFIX = '.snapshots'
+
+# Function to get the segment file that goes with an index chunk
+def segment_name(index_name):
+    return index_name[:-len('.bin')] + SEGMENT_SUFFIX
+
+class SnapshotArchive:
+    """Compressed API snapshots, one segment file per UTC hour.
+
+    Every snapshot is its own zlib frame appended to the hour's segment, and
+    its (ts, offset, length) goes to an index chunk of the same name, so any
+    time range is read back without decompressing anything outside it. The
+    frame is written before its index record, so readers never see a record
+    pointing past the end of a segment.
+    """
+
+    def __init__(self, folder, retention_days=90):
+        self.folder = folder
+        self.retention = retention_days * 86400
+        self.index = ChunkedTable(folder, INDEX_DTYPE, CHUNK_SECONDS)
+
+    def append(self, timestamp, data):
+        """Append the snapshot data (the decoded API response) taken at timestamp, returns the compressed size."""
+        frame = zlib.compress(json.dumps(data, separators=(',', ':')).encode(), 6)
+        start = int(timestamp // CHUNK_SECONDS) * CHUNK_SECONDS
+        with open(os.path.join(self.folder, segment_name(chunk_name(start))), 'ab') as f:
+            offset = f.tell()
+            f.write(frame)
+        record = np.array([(timestamp, offset, len(frame))], dtype=INDEX_DTYPE)
+        self.index.append(record)
+        return len(frame)
+
+    def read(self, start=None, end=None):
+        """Yield (timestamp, data) for the snapshots with start <= ts < end, in time order."""
+        for chunk, name in self.index.chunks():
+            if start is not None and chunk + CHUNK_SECONDS <= start:
+                continue
+            if end is not None and chunk >= end:
+                break
+            records = self.index.read_chunk(name)
+            if start is not None:
+                records = records[records['ts'] >= start]
+            if end is not None:
+                records = records[records['ts'] < end]
+            if len(records) == 0:
+                continue
+            with open(os.path.join(self.folder, segment_name(name)), 'rb') as f:
+                for ts, offset, length in records.tolist():
+                    f.seek(offset)
+                    yield ts, json.loads(zlib.decompress(f.read(length)))
+
+    def prune(self, now):
+        """Delete the segments past the retention, returns the removed index chunk names."""
+        removed = self.index.prune(now - self.retention)
+        for name in removed:
+            try:
+                os.remove(os.path.join(self.folder, segment_name(name)))
+            except FileNotFoundError:
+                pass
+        return removed
+
+    def first_timestamp(self):
+        return self.index.first_timestamp()
+
+    def last_timestamp(self):
+        return self.index.last_timestamp()
+
+# Function to get the archive folder of a data folder
+def archive_folder(data_folder):
+    return os.path.join(data_folder, 'archive')
@@ -0,0 +1,40 @@
+import os
+import json
+import hashlib
+
+MANIFEST_FILE = 'charts_manifest.json'
+
+# Series the browser draws the charts from in the client chart mode
+CHART_DATA_FILE = 'chart_data.json'
+
+CHART_NAMES = ['hashrate_stats_line_graph.png', 'worker_uptime_pie_chart.png', 'workers_connected_bar_chart.png', CHART_DATA_FILE]
+
+# 'png' draws the charts in the puller, 'client' only publishes CHART_DATA_FILE for the browser to draw
+CHART_MODES = ('png', 'client')
+
+# Bump when the chart drawing code changes so existing renders are redone
+CHART_STYLE_VERSION = 2
+
+# Function to hash the data a chart is drawn from
+def fingerprint(*parts):
+    digest = hashlib.sha256(str(CHART_STYLE_VERSION).encode())
+    for part in parts:
+        digest.update(json.dumps(part, sort_keys=True, default=str).encode())
+    return digest.hexdigest()[:32]
+
+def load_manifest(charts_folder):
+    manifest_file = os.path.join(charts_folder, MANIFEST_FILE)
+    if not os.path.exists(manifest_file):
+        return {}
+    try:
+        with open(manifest_file, 'r') as f:
+            return json.load(f)
+    except ValueError:
+        return {}
+
+def save_manifest(charts_folder, manifest):
+    manifest_file = os.path.join(charts_folder, MANIFEST_FILE)
+    tmp_file = manifest_file + '.tmp'
+    with open(tmp_file, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_file, manifest_file)
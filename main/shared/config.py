@@ -1,30 +1,241 @@
-import mysql.connector
+import os
+import json
+import math
+import signal
+import threading
+from dataclasses import dataclass, field, fields
+from .chart_manifest import CHART_MODES
 
+app_path = os.path.dirname(os.path.abspath(__file__))
+secrets_file = os.path.join(app_path, '..', 'secrets', 'secrets.json')
+live_secrets_file = os.path.join(app_path, '..', 'live_secrets', 'secrets.json')
+
+# Function to get the secrets.json in use, live_secrets wins over the template in secrets
+def config_path():
+    return live_secrets_file if os.path.exists(live_secrets_file) else secrets_file
+
+def _setting(key=None, **kwargs):
+    return field(metadata={'key': key}, **kwargs)
+
+# Function to get the secrets.json key of a Config attribute
+def _key(setting):
+    return setting.metadata.get('key') or setting.name.replace('_', '-')
+
+# Shortest poll-interval in seconds, the pool API is not meant to be polled more often
+MIN_POLL_INTERVAL = 10
+
+# When values of logging's TimedRotatingFileHandler, upper case; '' rotates by size instead
+ROTATE_WHEN = ('', 'S', 'M', 'H', 'D', 'MIDNIGHT') + tuple(f'W{day}' for day in range(7))
+
+@dataclass(frozen=True)
 class Config:
-    SESSION_SECRET_KEY = 'feda5b49-1f4c-357f-a94f-e5afafdad43e'
-    DEBUG = True
-    INFO = True
-    DB_HOST = 'localhost'
-    DB_PORT = 3306
-    DB_USER = 'chatsphere'
-    DB_PASSWORD = 'ChatSphere!'
-    DB_NAME = 'chat_sphere_data'
-        
-    def get_db_connection(self):
-        return mysql.connector.connect(
-            host=self.DB_HOST,
-            port=self.DB_PORT,
-            user=self.DB_USER,
-            password=self.DB_PASSWORD,
-            database=self.DB_NAME
-        )
-
-class ProductionConfig(Config):
-    DEBUG = False
-
-class DevelopmentConfig(Config):
-    DEBUG = True
-    
-class TestingConfig(Config):
-    TESTING = True
-    
\ No newline at end of file
+    """secrets.json as typed, validated attributes. Keys map to attributes with '-' as '_'."""
+
+    api_endpoint: str = ''
+    api_key: str = ''
+    accounts: list = field(default_factory=list)
+    api_max_concurrency: int = 4
+    api_timeout: float = 10
+    api_retries: int = 3
+    poll_interval: float = 60
+    render_processes: int = 2
+    rollup_retention_days: dict = field(default_factory=dict)
+    worker_chart_cache_mb: float = 32
+    chart_mode: str = 'png'
+    archive_retention_days: float = 90
+    history_backend: str = 'files'
+    history_retention_days: float = 30
+    history_read_connections: int = 4
+    email_notifications: list = field(default_factory=list)
+    smtp_server: str = ''
+    smtp_port: int = 25
+    smtp_user: str = ''
+    smtp_password: str = ''
+    smtp_use_ssl: bool = False
+    smtp_use_tls: bool = True
+    alert_sink: str = 'smtp'
+    alert_sink_folder: str = ''
+    alert_coalesce_seconds: float = 30
+    anomaly_drop: float = 0.25
+    anomaly_z_score: float = 3
+    anomaly_alpha: float = 0.05
+    anomaly_hold_minutes: float = 10
+    anomaly_warmup_polls: int = 30
+    anomaly_relearn_hours: float = 24
+    log_folder: str = ''
+    log_format: str = 'text'
+    log_async: bool = True
+    log_max_bytes: int = 10 * 2**20
+    log_backup_count: int = 5
+    log_rotate_when: str = ''
+    http_listen_on: str = _setting('http_listen_on', default='0.0.0.0')
+    http_port: int = _setting('http_port', default=3000)
+    pass_key: str = ''
+
+    @classmethod
+    def from_dict(cls, data):
+        """Build and validate a Config, raises ValueError naming every bad setting."""
+        values = {}
+        errors = []
+        for setting in fields(cls):
+            key = _key(setting)
+            if key not in data:
+                continue
+            value = data[key]
+            expected = setting.type
+            if expected is float and isinstance(value, int) and not isinstance(value, bool):
+                value = float(value)
+            if not isinstance(value, expected) or (expected is int and isinstance(value, bool)):
+                errors.append(f"'{key}' must be a {expected.__name__}, got {json.dumps(value)}")
+                continue
+            values[setting.name] = value
+
+        config = cls(**values)
+        errors += config.validate()
+        if errors:
+            raise ValueError('Invalid secrets.json: ' + '; '.join(errors))
+        return config
+
+    def validate(self):
+        errors = []
+        settings = {setting.name: setting for setting in fields(self)}
+        for name, setting in settings.items():
+            if setting.type is float and not math.isfinite(getattr(self, name)):
+                errors.append(f"'{_key(setting)}' must be a finite number")
+        for name in ('api_max_concurrency', 'render_processes', 'http_port', 'history_read_connections', 'anomaly_warmup_polls'):
+            if getattr(self, name) < 1:
+                errors.append(f"'{_key(settings[name])}' must be at least 1")
+        if self.poll_interval < MIN_POLL_INTERVAL:
+            errors.append(f"'poll-interval' must be at least {MIN_POLL_INTERVAL} seconds")
+        for name in ('api_timeout', 'worker_chart_cache_mb', 'history_retention_days', 'log_max_bytes',
+                     'anomaly_relearn_hours'):
+            if getattr(self, name) <= 0:
+                errors.append(f"'{_key(settings[name])}' must be positive")
+        if self.archive_retention_days < 0:
+            errors.append("'archive-retention-days' must be 0 (no archive) or more")
+        if not 0 <= self.anomaly_drop < 1:
+            errors.append("'anomaly-drop' must be 0 (no anomaly detection) or a fraction below 1")
+        if not 0 < self.anomaly_alpha <= 1:
+            errors.append("'anomaly-alpha' must be above 0 and at most 1")
+        for name in ('anomaly_z_score', 'anomaly_hold_minutes'):
+            if getattr(self, name) < 0:
+                errors.append(f"'{_key(settings[name])}' must be 0 or more")
+        if self.http_port > 65535:
+            errors.append("'http_port' must be a port number")
+        if self.chart_mode not in CHART_MODES:
+            errors.append(f"'chart-mode' must be one of {', '.join(CHART_MODES)}")
+        if self.history_backend not in ('files', 'sqlite'):
+            errors.append("'history-backend' must be 'files' or 'sqlite'")
+        if self.alert_sink not in ('smtp', 'file'):
+            errors.append("'alert-sink' must be 'smtp' or 'file'")
+        if self.log_format not in ('text', 'json'):
+            errors.append("'log-format' must be 'text' or 'json'")
+        if self.log_rotate_when.upper() not in ROTATE_WHEN:
+            errors.append("'log-rotate-when' must be '' (rotate by size), 'S', 'M', 'H', 'D', 'midnight' or 'W0' to 'W6'")
+        if not all(isinstance(email, str) for email in self.email_notifications):
+            errors.append("'email-notifications' must be a list of addresses")
+        for entry in self.accounts:
+            if not isinstance(entry, dict) or not entry.get('name') or not entry.get('api-key'):
+                errors.append("every entry in 'accounts' needs a 'name' and an 'api-key'")
+                break
+        for tier, days in self.rollup_retention_days.items():
+            if (tier not in ('5m', '1h', '1d') or not isinstance(days, (int, float)) or isinstance(days, bool)
+                    or not math.isfinite(days) or days <= 0):
+                errors.append(f"'rollup-retention-days' has an invalid entry for '{tier}'")
+        return errors
+
+# Function to read and validate the secrets.json in use
+def load_config(path=None):
+    with open(path or config_path(), 'r') as f:
+        return Config.from_dict(json.load(f))
+
+class ConfigStore:
+    """The process's Config, loaded once and swapped whole when secrets.json changes.
+
+    get() only returns the current object. A watcher thread stats the file every
+    interval and reloads it when its inode, mtime or size changed; an invalid
+    edit is logged and the previous config is kept.
+    """
+
+    def __init__(self, interval=2.0):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.current = None
+        self.file_key = None
+        self.thread = None
+        # Set by request_reload() to wake the watcher for a forced reload
+        self.wake = threading.Event()
+
+    def get(self):
+        current = self.current
+        if current is not None:
+            return current
+        with self.lock:
+            if self.current is None:
+                path = config_path()
+                file_key = self._file_key(path)
+                if file_key is None:
+                    raise FileNotFoundError(f"Secrets file not found at {secrets_file}")
+                self.current = load_config(path)
+                self.file_key = file_key
+                self.thread = threading.Thread(target=self._watch, name='ConfigWatcher', daemon=True)
+                self.thread.start()
+            return self.current
+
+    @staticmethod
+    def _file_key(path):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return (path, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def reload(self, force=False):
+        """Re-read secrets.json if it changed (always with force), returns True if the config was replaced."""
+        with self.lock:
+            path = config_path()
+            file_key = self._file_key(path)
+            if file_key is None or (file_key == self.file_key and not force):
+                return False
+            try:
+                config = load_config(path)
+            except (OSError, ValueError) as e:
+                from shared.mylogging import logging
+                logging.get_logger(loggername=__name__).error(f"Keeping the previous configuration: {e}")
+                # Do not retry the same broken file every interval
+                self.file_key = file_key
+                return False
+            self.current = config
+            self.file_key = file_key
+            return True
+
+    def request_reload(self):
+        """Safe from a signal handler, the watcher thread does the reload."""
+        self.wake.set()
+
+    def _watch(self):
+        while True:
+            forced = self.wake.wait(self.interval)
+            self.wake.clear()
+            self.reload(force=forced)
+
+_store = ConfigStore()
+
+def _restart_watcher():
+    # Only the forking thread survives a fork, give a child that inherited a loaded config its own watcher
+    if _store.current is not None:
+        _store.lock = threading.Lock()
+        _store.thread = threading.Thread(target=_store._watch, name='ConfigWatcher', daemon=True)
+        _store.thread.start()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_restart_watcher)
+
+# Function to get the current configuration, without any I/O once it is loaded
+def get_config() -> Config:
+    return _store.get()
+
+# Function to reload the configuration on SIGHUP, where the platform has it; call from the main thread
+def install_reload_signal():
+    if hasattr(signal, 'SIGHUP') and threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGHUP, lambda signum, frame: _store.request_reload())
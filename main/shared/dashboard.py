@@ -0,0 +1,237 @@
+import os
+import mmap
+import glob
+import time
+import struct
+import threading
+import numpy as np
+from .timeseries import SampleStore
+from .worker_state import WorkerStateReader
+
+SEQUENCE_FILE = 'dashboard.seq'
+SEQUENCE = struct.Struct('<Q')
+BLOB_FORMAT = 'dashboard.{}.bin'
+
+# magic, format, sequence, last sample ts (nan for none), workers, connected, zero hash rate, string bytes, total hash rate
+HEADER = struct.Struct('<4sIQdIIIId')
+MAGIC = b'LPDS'
+FORMAT = 1
+
+# One record per worker after the header, the strings they point into follow the records
+WORKER_DTYPE = np.dtype([
+    ('name', '<u4'),            # offset and length of the name in the strings
+    ('name_length', '<u4'),
+    ('since', '<u4'),           # offset and length of disconnected_since as the puller wrote it, 0 length for none
+    ('since_length', '<u4'),
+    ('connected', 'u1'),
+    ('hash_rate', '<f8'),
+])
+
+# Function to get the blob file of a sequence number
+def blob_path(data_folder, sequence):
+    return os.path.join(data_folder, BLOB_FORMAT.format(sequence))
+
+class DashboardPublisher:
+    """Puller side: writes each worker state as an immutable blob and then bumps the sequence in dashboard.seq.
+
+    A blob is written under a new name and never modified, so a reader that
+    mapped it keeps a consistent view however many versions are published
+    after it. The previous KEEP blobs are left for readers still switching.
+    """
+
+    KEEP = 2
+
+    def __init__(self, data_folder):
+        self.data_folder = data_folder
+        path = os.path.join(data_folder, SEQUENCE_FILE)
+        if not os.path.exists(path) or os.path.getsize(path) != SEQUENCE.size:
+            with open(path, 'wb') as f:
+                f.write(SEQUENCE.pack(0))
+        self.file = open(path, 'r+b')
+        self.header = mmap.mmap(self.file.fileno(), SEQUENCE.size)
+        # Continue from the last run, readers only look for a sequence that changed
+        self.sequence = SEQUENCE.unpack_from(self.header)[0]
+
+    def publish(self, workers, last_sample_timestamp):
+        """Publish the worker summaries ({name: details} as kept by WorkerState), returns the new sequence number."""
+        sequence = self.sequence + 1
+        count = len(workers)
+        strings = bytearray()
+        # (name offset, name length, since offset, since length) per worker
+        offsets = []
+        for name, details in workers.items():
+            encoded = name.encode()
+            name_offset = len(strings)
+            strings += encoded
+            since = (details.get('disconnected_since') or '').encode()
+            offsets.append((name_offset, len(encoded), len(strings), len(since)))
+            strings += since
+        records = np.zeros(count, dtype=WORKER_DTYPE)
+        if count:
+            offsets = np.array(offsets, dtype='<u4')
+            for i, column in enumerate(('name', 'name_length', 'since', 'since_length')):
+                records[column] = offsets[:, i]
+            details = workers.values()
+            records['connected'] = np.fromiter((bool(worker.get('connected')) for worker in details), dtype=bool, count=count)
+            records['hash_rate'] = np.fromiter((worker.get('hash_rate') or 0 for worker in details), dtype='<f8', count=count)
+        connected = records['connected'].astype(bool)
+        header = HEADER.pack(MAGIC, FORMAT, sequence, np.nan if last_sample_timestamp is None else last_sample_timestamp,
+                             count, int(np.count_nonzero(connected)), int(np.count_nonzero(connected & (records['hash_rate'] == 0))),
+                             len(strings), float(records['hash_rate'].sum()))
+
+        path = blob_path(self.data_folder, sequence)
+        tmp_file = path + '.tmp'
+        with open(tmp_file, 'wb') as f:
+            f.write(header)
+            f.write(records.tobytes())
+            f.write(strings)
+        os.replace(tmp_file, path)
+        # The blob is complete before readers can see its number
+        SEQUENCE.pack_into(self.header, 0, sequence)
+        self.sequence = sequence
+        self._remove_old(sequence - self.KEEP)
+        return sequence
+
+    def _remove_old(self, oldest_kept):
+        for path in glob.glob(os.path.join(self.data_folder, BLOB_FORMAT.format('*'))):
+            try:
+                if int(os.path.basename(path).split('.')[1]) < oldest_kept:
+                    os.remove(path)
+            except ValueError:
+                continue
+            except PermissionError:
+                # Windows does not delete a file a reader still maps, try again after the next publish
+                continue
+
+    def close(self):
+        self.header.close()
+        self.file.close()
+
+class DashboardView:
+    """One published blob mapped read-only; the columns are numpy views into the mapping, nothing is copied."""
+
+    def __init__(self, buffer):
+        magic, version, self.sequence, last_sample, count, self.connected, self.zero_hash, strings_length, self.total_hash_rate = \
+            HEADER.unpack_from(buffer)
+        if magic != MAGIC or version != FORMAT:
+            raise ValueError('Not a dashboard snapshot')
+        self.buffer = buffer
+        self.last_timestamp = None if np.isnan(last_sample) else last_sample
+        self.count = count
+        self.records = np.frombuffer(buffer, dtype=WORKER_DTYPE, count=count, offset=HEADER.size)
+        start = HEADER.size + count * WORKER_DTYPE.itemsize
+        self.strings = memoryview(buffer)[start:start + strings_length]
+        self._workers = None
+        self._down = None
+
+    def _string(self, offset, length):
+        return str(self.strings[offset:offset + length], 'utf-8')
+
+    def workers(self):
+        """{name: details} in the form WorkerStateReader returns, built once per version."""
+        if self._workers is None:
+            workers = {}
+            for name, name_length, since, since_length, connected, hash_rate in self.records.tolist():
+                workers[self._string(name, name_length)] = {
+                    'connected': bool(connected),
+                    'hash_rate': hash_rate,
+                    'disconnected_since': self._string(since, since_length) if since_length else None,
+                }
+            self._workers = workers
+        return self._workers
+
+    def down(self):
+        """Names of the workers that are disconnected or have a 0 hash rate, sorted."""
+        if self._down is None:
+            records = self.records[(self.records['connected'] == 0) | (self.records['hash_rate'] == 0)]
+            self._down = sorted(self._string(offset, length) for offset, length in zip(records['name'].tolist(), records['name_length'].tolist()))
+        return self._down
+
+class DashboardReader:
+    """Webserver side of the dashboard snapshot, one per process.
+
+    Maps dashboard.seq and the current blob read-only; each call only reads the
+    sequence number out of the mapping and remaps when it changed. Until the
+    puller has published a snapshot it falls back to workers_summary.json and
+    the sample store.
+    """
+
+    # Seconds between looks for dashboard.seq while it does not exist
+    RETRY = 1.0
+
+    def __init__(self, data_folder, store: SampleStore):
+        self.data_folder = data_folder
+        self.store = store
+        self.fallback = WorkerStateReader(data_folder)
+        self.lock = threading.Lock()
+        self.header = None
+        self.next_try = 0
+        # (source key, DashboardView or None, version) swapped as one tuple
+        self.current = (None, None, 0)
+
+    def _open_header(self):
+        now = time.monotonic()
+        if now < self.next_try:
+            return None
+        self.next_try = now + self.RETRY
+        try:
+            with open(os.path.join(self.data_folder, SEQUENCE_FILE), 'rb') as f:
+                self.header = mmap.mmap(f.fileno(), SEQUENCE.size, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+        return self.header
+
+    def _view(self):
+        """(version, DashboardView) of the newest published blob, (None, None) while nothing is published."""
+        header = self.header or self._open_header()
+        if header is None:
+            return None, None
+        sequence = SEQUENCE.unpack_from(header)[0]
+        current = self.current
+        if current[0] == sequence:
+            return current[2], current[1]
+        if sequence == 0:
+            return None, None
+        with self.lock:
+            key, view, version = self.current
+            if key != sequence:
+                try:
+                    with open(blob_path(self.data_folder, sequence), 'rb') as f:
+                        view = DashboardView(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+                except (OSError, ValueError):
+                    # Replaced by a newer blob before we got to it, the next call picks that one up
+                    return (version, view) if view is not None else (None, None)
+                self.current = (sequence, view, version + 1)
+            return self.current[2], self.current[1]
+
+    def snapshot(self):
+        """Returns (version, workers) like WorkerStateReader.snapshot(); the dict is shared and must not be modified."""
+        version, view = self._view()
+        if view is not None:
+            return version, view.workers()
+        file_version, workers = self.fallback.snapshot()
+        with self.lock:
+            key, _, version = self.current
+            if key != ('file', file_version):
+                self.current = (('file', file_version), None, version + 1)
+            return self.current[2], workers
+
+    def last_timestamp(self):
+        _, view = self._view()
+        return view.last_timestamp if view is not None else self.store.last_timestamp()
+
+    def summary(self):
+        """Fleet totals: workers, connected, zero_hash_rate, total_hash_rate and the sorted down names."""
+        _, view = self._view()
+        if view is not None:
+            return {'workers': view.count, 'connected': view.connected, 'zero_hash_rate': view.zero_hash,
+                    'total_hash_rate': view.total_hash_rate, 'down': view.down()}
+        _, workers = self.fallback.snapshot()
+        connected = sum(1 for details in workers.values() if details.get('connected'))
+        return {
+            'workers': len(workers),
+            'connected': connected,
+            'zero_hash_rate': sum(1 for details in workers.values() if details.get('connected') and not details.get('hash_rate')),
+            'total_hash_rate': float(sum(details.get('hash_rate') or 0 for details in workers.values())),
+            'down': sorted(name for name, details in workers.items() if not details.get('connected') or not details.get('hash_rate')),
+        }
@@ -0,0 +1,51 @@
+import numpy as np
+
+# Function to pick at most threshold points with Largest-Triangle-Three-Buckets
+def lttb(x, y, threshold):
+    length = len(x)
+    if threshold >= length or threshold < 3:
+        return np.arange(length)
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = length - 1
+    bucket_size = (length - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        bucket_start = int(i * bucket_size) + 1
+        bucket_end = int((i + 1) * bucket_size) + 1
+        next_start = bucket_end
+        next_end = min(int((i + 2) * bucket_size) + 1, length)
+        if next_start >= next_end:
+            next_start, next_end = length - 1, length
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        areas = np.abs((x[a] - avg_x) * (y[bucket_start:bucket_end] - y[a])
+                       - (x[a] - x[bucket_start:bucket_end]) * (avg_y - y[a]))
+        a = bucket_start + int(np.argmax(areas))
+        selected[i + 1] = a
+    return selected
+
+# Function to reduce rollup records to fixed steps, returns the step starts and hash rate min/max/mean, connected fraction and disconnects per step
+def downsample_rollups(records, start, end, step):
+    edges = np.arange(start, end, step, dtype=np.float64)
+    bins = ((records['ts'] - start) // step).astype(np.int64)
+    keep = (bins >= 0) & (bins < len(edges))
+    bins = bins[keep]
+    records = records[keep]
+
+    samples = np.bincount(bins, weights=records['samples'], minlength=len(edges))
+    connected = np.bincount(bins, weights=records['connected'], minlength=len(edges))
+    disconnects = np.bincount(bins, weights=records['disconnects'], minlength=len(edges))
+    sums = np.bincount(bins, weights=records['hash_sum'], minlength=len(edges))
+    mins = np.full(len(edges), np.inf)
+    maxs = np.full(len(edges), -np.inf)
+    np.minimum.at(mins, bins, records['hash_min'])
+    np.maximum.at(maxs, bins, records['hash_max'])
+
+    filled = samples > 0
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = sums / samples
+        connected = connected / samples
+    return edges[filled], mins[filled], maxs[filled], means[filled], connected[filled], disconnects[filled]
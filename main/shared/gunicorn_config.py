@@ -1,4 +1,18 @@
 bind = "0.0.0.0:5000"
 workers = 4
 accesslog = "access.log"
-errorlog = "errors.log"
\ No newline at end of file
+errorlog = "errors.log"
+# /events holds a connection open per dashboard, so serve requests from threads
+worker_class = "gthread"
+threads = 32
+
+# Runs in the arbiter before each fork, a new worker takes the lowest log slot no live worker holds
+def pre_fork(server, worker):
+    used = {getattr(other, 'log_slot', None) for other in server.WORKERS.values()}
+    worker.log_slot = next(slot for slot in range(len(used) + 1) if slot not in used)
+
+# Runs in each worker before the app is loaded, so flask_app's own configure() call is then ignored
+def post_fork(server, worker):
+    from shared.mylogging import logging
+    # Every live worker writes its own webserver.<slot>.log, they would race rotating one shared file
+    logging.configure('webserver', slot=worker.log_slot)
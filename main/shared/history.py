@@ -0,0 +1,178 @@
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from .transitions import DOWN_STATES
+
+HISTORY_FILE = 'history.sqlite3'
+
+# Worker ids are the sample store's, so a worker has the same id in the chunk files and here
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS workers (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS samples (
+    ts REAL NOT NULL,
+    worker INTEGER NOT NULL,
+    connected INTEGER NOT NULL,
+    hash_rate REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS samples_worker_ts ON samples (worker, ts);
+CREATE INDEX IF NOT EXISTS samples_ts ON samples (ts);
+CREATE TABLE IF NOT EXISTS transitions (
+    ts REAL NOT NULL,
+    worker INTEGER NOT NULL,
+    state TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS transitions_worker_ts ON transitions (worker, ts);
+CREATE INDEX IF NOT EXISTS transitions_ts ON transitions (ts);
+CREATE TABLE IF NOT EXISTS alerts (
+    ts REAL NOT NULL,
+    worker INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    subject TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS alerts_ts ON alerts (ts);
+"""
+
+class HistoryWriter:
+    """The puller's connection to history.sqlite3, in WAL mode so web readers never block it.
+
+    Everything a poll produced goes in with record_poll() as one transaction.
+    """
+
+    def __init__(self, path, retention_days=30):
+        self.path = path
+        self.retention = retention_days * 86400
+        self.lock = threading.Lock()
+        # Used from the aggregate stage and the prune, never at the same time thanks to the lock
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        # WAL with synchronous=NORMAL only fsyncs at checkpoints, a crash can lose the last polls but not corrupt the file
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.executescript(SCHEMA)
+        self.known_workers = self.connection.execute('SELECT COUNT(*) FROM workers').fetchone()[0]
+
+    def record_poll(self, store, records, transitions, timestamp):
+        """Insert a poll's sample records, its (worker, state, alert subject or None) transitions and alerts."""
+        worker_ids = {}
+        for worker, _, _ in transitions:
+            worker_ids[worker] = store.worker_id(worker)
+        with self.lock, self.connection:
+            names = store.worker_names()
+            if len(names) > self.known_workers:
+                # Ids are handed out in order, so only the tail of the store's worker table is new
+                self.connection.executemany('INSERT OR IGNORE INTO workers (id, name) VALUES (?, ?)',
+                                            enumerate(names[self.known_workers:], self.known_workers))
+                self.known_workers = len(names)
+            self.connection.executemany('INSERT INTO samples (ts, worker, connected, hash_rate) VALUES (?, ?, ?, ?)',
+                                        records[['ts', 'worker', 'connected', 'hash_rate']].tolist())
+            self.connection.executemany('INSERT INTO transitions (ts, worker, state) VALUES (?, ?, ?)',
+                                        [(timestamp, worker_ids[worker], state) for worker, state, _ in transitions])
+            self.connection.executemany('INSERT INTO alerts (ts, worker, kind, subject) VALUES (?, ?, ?, ?)',
+                                        [(timestamp, worker_ids[worker], state, subject)
+                                         for worker, state, subject in transitions if subject])
+
+    def prune(self, now):
+        """Delete samples and alerts past the retention; transitions are kept so outages stay answerable."""
+        cutoff = now - self.retention
+        with self.lock, self.connection:
+            self.connection.execute('DELETE FROM samples WHERE ts < ?', (cutoff,))
+            self.connection.execute('DELETE FROM alerts WHERE ts < ?', (cutoff,))
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+class HistoryReader:
+    """Read-only connections to history.sqlite3, pooled per process.
+
+    Connections are opened on first use, so a gunicorn worker only ever uses
+    connections it opened itself.
+    """
+
+    def __init__(self, path, pool_size=4):
+        self.path = path
+        self.pool_size = pool_size
+        self.pool = queue.LifoQueue()
+        self.opened = 0
+        self.lock = threading.Lock()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self.pool = queue.LifoQueue()
+        self.opened = 0
+        self.lock = threading.Lock()
+
+    def _open(self):
+        uri = 'file:' + os.path.abspath(self.path).replace('\\', '/') + '?mode=ro'
+        connection = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection, waits for one to be returned once pool_size are open.
+
+        Raises sqlite3.OperationalError when the puller has not created the database yet.
+        """
+        with self.lock:
+            opened = self.opened < self.pool_size and self.pool.empty()
+            if opened:
+                self.opened += 1
+        if opened:
+            try:
+                connection = self._open()
+            except sqlite3.Error:
+                with self.lock:
+                    self.opened -= 1
+                raise
+        else:
+            connection = self.pool.get()
+        try:
+            yield connection
+        finally:
+            self.pool.put(connection)
+
+    def worker_history(self, name, start, end):
+        """(samples, transitions) of one worker with start <= ts < end, None for an unknown worker."""
+        with self.connection() as connection:
+            row = connection.execute('SELECT id FROM workers WHERE name = ?', (name,)).fetchone()
+            if row is None:
+                return None
+            samples = connection.execute(
+                'SELECT ts, connected, hash_rate FROM samples WHERE worker = ? AND ts >= ? AND ts < ? ORDER BY ts',
+                (row['id'], start, end)).fetchall()
+            transitions = connection.execute(
+                'SELECT ts, state FROM transitions WHERE worker = ? AND ts >= ? AND ts < ? ORDER BY ts',
+                (row['id'], start, end)).fetchall()
+        return [dict(sample) for sample in samples], [dict(transition) for transition in transitions]
+
+    def down_between(self, start, end):
+        """Workers that were down at some point in [start, end), with the state and time their outage began."""
+        with self.connection() as connection:
+            # Down at start: the last transition before start was a down state
+            rows = connection.execute("""
+                SELECT workers.name AS worker, state, ts AS since FROM (
+                    SELECT worker, state, MAX(ts) AS ts FROM transitions WHERE ts < ? GROUP BY worker
+                ) AS last JOIN workers ON workers.id = last.worker WHERE state IN (?, ?)
+                UNION ALL
+                SELECT workers.name, state, MIN(ts) FROM transitions JOIN workers ON workers.id = transitions.worker
+                WHERE ts >= ? AND ts < ? AND state IN (?, ?) GROUP BY worker
+            """, (start, *DOWN_STATES, start, end, *DOWN_STATES)).fetchall()
+        down = {}
+        # An outage already running at start wins over a later one in the range
+        for row in rows:
+            if row['worker'] not in down:
+                down[row['worker']] = dict(row)
+        return sorted(down.values(), key=lambda row: (row['since'], row['worker']))
+
+    def alerts(self, start, end):
+        with self.connection() as connection:
+            rows = connection.execute(
+                'SELECT alerts.ts, workers.name AS worker, kind, subject FROM alerts JOIN workers ON workers.id = alerts.worker '
+                'WHERE alerts.ts >= ? AND alerts.ts < ? ORDER BY alerts.ts', (start, end)).fetchall()
+        return [dict(row) for row in rows]
@@ -1,30 +1,114 @@
 import logging as baselogging
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+import os
 import sys
-import re
+import json
+import queue
+import atexit
+import threading
+from datetime import datetime, timezone
+from shared.config import Config, get_config
 
-def strip_ansi_codes(text):
-    ansi_escape = re.compile(r'\x1B[@-_][0-?]*[ -/]*[@-~]')
-    return ansi_escape.sub('', text)
+app_path = os.path.dirname(os.path.abspath(__file__))
+default_log_folder = os.path.join(app_path, '..', 'logs')
 
-# Custom formatter that strips ANSI codes
-class StripAnsiFormatter(baselogging.Formatter):
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+COLORS = {baselogging.INFO: '\033[1;33m', baselogging.ERROR: '\033[1;31m', baselogging.CRITICAL: '\033[1;31m'}
+RESET = '\033[0m'
+
+# Console formatter that colors INFO and ERROR lines, only used when the console is a terminal
+class ColorFormatter(baselogging.Formatter):
+    def format(self, record: baselogging.LogRecord):
+        text = super().format(record)
+        color = COLORS.get(record.levelno)
+        return color + text + RESET if color else text
+
+# One JSON object per line, for log shippers
+class JsonFormatter(baselogging.Formatter):
     def format(self, record: baselogging.LogRecord):
-        original = super().format(record)
-        return strip_ansi_codes(original)
+        entry = {
+            'time': datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry)
 
 class MyLogger(baselogging.Logger):
     def __init__(self, name, level=baselogging.DEBUG):
         super().__init__(name, level)
         self.setLevel(level)
 
-    def info(self, text):
-        super().info("\033[1;33m" + text + "\033[0m")
-
-    def error(self, text):
-        super().error("\033[1;31m" + text + "\033[0m")
+# Function to read the log-* settings, defaults when there is no valid secrets.json
+def _log_settings():
+    try:
+        config = get_config()
+    except (FileNotFoundError, ValueError):
+        config = Config()
+    return {
+        'folder': config.log_folder or default_log_folder,
+        'format': config.log_format,
+        'async': config.log_async,
+        'max_bytes': config.log_max_bytes,
+        'backup_count': config.log_backup_count,
+        'rotate_when': config.log_rotate_when,
+    }
 
 class logging:
     loggers = {}
+    handlers = None
+    listener = None
+    lock = threading.Lock()
+
+    @staticmethod
+    def configure(name='litepool', settings=None, slot=None):
+        """Set up the console and <log folder>/<name>.log handlers every logger of this process writes to.
+
+        In async mode loggers only put records on a queue; a listener thread does
+        the formatting and the writes. Call before the first get_logger(), later
+        calls are ignored. With a slot the file is <name>.<slot>.log, for
+        processes that run side by side: rotation renames the file, which is not
+        safe with several processes writing it. A slot is reused by the process
+        replacing one that exited, so the number of files stays bounded.
+        """
+        with logging.lock:
+            if logging.handlers is not None:
+                return
+            settings = settings or _log_settings()
+            json_output = settings['format'] == 'json'
+
+            console_handler = baselogging.StreamHandler(sys.stdout)
+            if json_output:
+                console_handler.setFormatter(JsonFormatter())
+            elif sys.stdout.isatty():
+                console_handler.setFormatter(ColorFormatter(TEXT_FORMAT))
+            else:
+                console_handler.setFormatter(baselogging.Formatter(TEXT_FORMAT))
+
+            folder = settings['folder']
+            if not os.path.exists(folder):
+                os.makedirs(folder)
+            log_file = os.path.join(folder, f'{name}.{slot}.log' if slot is not None else f'{name}.log')
+            if settings['rotate_when']:
+                file_handler = TimedRotatingFileHandler(
+                    log_file, when=settings['rotate_when'], backupCount=settings['backup_count'], encoding='utf-8')
+            else:
+                file_handler = RotatingFileHandler(
+                    log_file, maxBytes=settings['max_bytes'], backupCount=settings['backup_count'], encoding='utf-8')
+            file_handler.setFormatter(JsonFormatter() if json_output else baselogging.Formatter(TEXT_FORMAT))
+
+            if settings['async']:
+                log_queue = queue.SimpleQueue()
+                logging.listener = QueueListener(log_queue, console_handler, file_handler)
+                logging.listener.start()
+                # Drain the queue on exit so the last records are not lost
+                atexit.register(logging.listener.stop)
+                logging.handlers = [QueueHandler(log_queue)]
+            else:
+                logging.handlers = [console_handler, file_handler]
 
     @staticmethod
     def get_logger(config=None, loglevel=baselogging.ERROR, loggername=__name__) -> MyLogger:
@@ -38,27 +122,13 @@ class logging:
 
         if loggername in logging.loggers:
             return logging.loggers[loggername]
-            
-        # Create a logger
-        logger = MyLogger(loggername, loglevel)
 
-        # Ensure handlers are only added once
-        if not logger.hasHandlers():
-            # Console handler with colored output
-            console_handler = baselogging.StreamHandler(sys.stdout)
-            console_handler.setLevel(loglevel)
-            console_format = baselogging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-            console_handler.setFormatter(console_format)
-
-            # File handler without colored output
-            file_handler = baselogging.FileHandler('logfile.log')
-            file_handler.setLevel(loglevel)
-            file_format = StripAnsiFormatter('%(asctime)s - %(levelname)s - %(message)s')
-            file_handler.setFormatter(file_format)
-
-            # Add handlers to the logger
-            logger.addHandler(console_handler)
-            logger.addHandler(file_handler)
+        logging.configure()
+
+        # Create a logger, the level is checked here before anything is queued or formatted
+        logger = MyLogger(loggername, loglevel)
+        for handler in logging.handlers:
+            logger.addHandler(handler)
 
         logging.loggers[loggername] = logger
         return logger
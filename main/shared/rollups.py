@@ -0,0 +1,235 @@
+import os
+import json
+import time
+import numpy as np
+from .timeseries import ChunkedTable, SampleStore
+
+# One record per worker per bucket, 48 bytes on disk
+ROLLUP_DTYPE = np.dtype([
+    ('ts', '<f8'),          # bucket start (unix seconds)
+    ('worker', '<u4'),
+    ('samples', '<u4'),
+    ('connected', '<u4'),   # samples with the worker connected
+    ('disconnects', '<u4'), # connected -> disconnected transitions
+    ('hash_min', '<f8'),
+    ('hash_max', '<f8'),
+    ('hash_sum', '<f8'),
+])
+
+DAY = 86400
+RAW_RETENTION = DAY
+
+class RollupTier:
+    def __init__(self, name, seconds, retention, chunk_seconds, folder):
+        self.name = name
+        self.seconds = seconds
+        self.retention = retention
+        self.table = ChunkedTable(os.path.join(folder, f'rollup_{name}'), ROLLUP_DTYPE, chunk_seconds)
+
+# Function to list the tiers (name, bucket seconds, retention, chunk seconds) from finest to coarsest
+def default_tiers(retention_days=None):
+    retention_days = retention_days or {}
+    return [
+        ('5m', 300, retention_days.get('5m', 7) * DAY, DAY),
+        ('1h', 3600, retention_days.get('1h', 90) * DAY, 7 * DAY),
+        ('1d', DAY, retention_days.get('1d', 1825) * DAY, 30 * DAY),
+    ]
+
+# Function to turn raw samples into one-sample rollup records
+def samples_to_rollups(samples, last_connected=None):
+    """last_connected maps worker id to its state before these samples and is updated in place."""
+    records = np.zeros(len(samples), dtype=ROLLUP_DTYPE)
+    if len(samples) == 0:
+        return records
+    records['ts'] = samples['ts']
+    records['worker'] = samples['worker']
+    records['samples'] = 1
+    records['connected'] = samples['connected']
+    records['hash_min'] = samples['hash_rate']
+    records['hash_max'] = samples['hash_rate']
+    records['hash_sum'] = samples['hash_rate']
+
+    # Compare every sample with the previous sample of the same worker
+    order = np.lexsort((samples['ts'], samples['worker']))
+    workers = samples['worker'][order]
+    connected = samples['connected'][order].astype(bool)
+    previous = np.empty_like(connected)
+    previous[1:] = connected[:-1]
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = workers[1:] != workers[:-1]
+    last_connected = {} if last_connected is None else last_connected
+    # A worker with no known previous state does not count as a disconnect
+    previous[first] = [last_connected.get(str(worker), state) for worker, state in zip(workers[first], connected[first])]
+    disconnects = np.zeros(len(order), dtype='<u4')
+    disconnects[previous & ~connected] = 1
+    records['disconnects'][order] = disconnects
+
+    last = np.ones(len(order), dtype=bool)
+    last[:-1] = workers[1:] != workers[:-1]
+    for worker, state in zip(workers[last], connected[last]):
+        last_connected[str(worker)] = bool(state)
+    return records
+
+# Function to merge rollup records into buckets of the given size
+def combine(records, seconds):
+    if len(records) == 0:
+        return np.zeros(0, dtype=ROLLUP_DTYPE)
+    buckets = (records['ts'] // seconds).astype(np.int64)
+    keys = buckets * (int(records['worker'].max()) + 1) + records['worker']
+    unique_keys, index, inverse = np.unique(keys, return_index=True, return_inverse=True)
+
+    combined = np.zeros(len(unique_keys), dtype=ROLLUP_DTYPE)
+    combined['ts'] = buckets[index] * seconds
+    combined['worker'] = records['worker'][index]
+    combined['samples'] = np.bincount(inverse, weights=records['samples'], minlength=len(unique_keys))
+    combined['connected'] = np.bincount(inverse, weights=records['connected'], minlength=len(unique_keys))
+    combined['disconnects'] = np.bincount(inverse, weights=records['disconnects'], minlength=len(unique_keys))
+    combined['hash_sum'] = np.bincount(inverse, weights=records['hash_sum'], minlength=len(unique_keys))
+    hash_min = np.full(len(unique_keys), np.inf)
+    hash_max = np.full(len(unique_keys), -np.inf)
+    np.minimum.at(hash_min, inverse, records['hash_min'])
+    np.maximum.at(hash_max, inverse, records['hash_max'])
+    combined['hash_min'] = hash_min
+    combined['hash_max'] = hash_max
+    return combined
+
+class RollupManager:
+    """Compacts a sample store into 5 minute, hourly and daily per-worker rollups.
+
+    Each tier is built from the tier below it once a bucket is complete and
+    remembers how far it got (its watermark) in rollups.json, saved after every
+    tier's append. Queries read the coarsest tier that is fine enough and fill
+    in the part after its watermark from finer tiers, down to the raw samples.
+    """
+
+    def __init__(self, store: SampleStore, retention_days=None, raw_retention=RAW_RETENTION):
+        self.store = store
+        self.raw_retention = raw_retention
+        self.tiers = [RollupTier(name, seconds, retention, chunk_seconds, store.folder)
+                      for name, seconds, retention, chunk_seconds in default_tiers(retention_days)]
+        self.state_file = os.path.join(store.folder, 'rollups.json')
+        self.state = self._load_state()
+        # (mtime of rollups.json, its watermarks) as last read by query(), swapped as one tuple
+        self.query_state = (None, self.state['watermarks'])
+
+    def recover(self):
+        """Drop tier records past their watermark, returns how many; only for the process that compacts.
+
+        They are left over from a puller killed between an append and saving the
+        watermark, and would be rolled up and counted a second time otherwise.
+        """
+        dropped = 0
+        for tier in self.tiers:
+            watermark = self.state['watermarks'].get(tier.name)
+            if watermark is not None:
+                dropped += tier.table.truncate(watermark)
+        return dropped
+
+    def backfill(self, samples):
+        """Roll samples added behind the watermarks (an import of older history) into the tiers, returns the records added.
+
+        The part of the samples past a tier's watermark is left to compact(). A
+        tier without a watermark yet starts from the oldest sample anyway.
+        """
+        watermarks = self._load_state()['watermarks']
+        samples = samples[np.argsort(samples['ts'], kind='stable')]
+        # No state before the oldest imported sample, so its first sample per worker is not a disconnect
+        records = samples_to_rollups(samples)
+        added = 0
+        for tier in self.tiers:
+            watermark = watermarks.get(tier.name)
+            if watermark is None:
+                continue
+            combined = combine(records[records['ts'] < watermark], tier.seconds)
+            tier.table.merge(combined)
+            added += len(combined)
+        return added
+
+    def _load_state(self):
+        if os.path.exists(self.state_file):
+            try:
+                with open(self.state_file, 'r') as f:
+                    return json.load(f)
+            except ValueError:
+                pass
+        return {'watermarks': {}, 'last_connected': {}}
+
+    # Function to get the watermarks for a query, rollups.json is only re-read when the puller rewrote it
+    def _watermarks(self):
+        try:
+            mtime = os.stat(self.state_file).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        cached_mtime, watermarks = self.query_state
+        if mtime is not None and mtime != cached_mtime:
+            watermarks = self._load_state()['watermarks']
+            self.query_state = (mtime, watermarks)
+        return watermarks
+
+    def _save_state(self):
+        tmp_file = self.state_file + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump(self.state, f)
+        os.replace(tmp_file, self.state_file)
+
+    def compact(self, now):
+        """Roll every complete bucket up into its tier and drop what is past retention."""
+        source_end = now
+        source_start = self.store.table.first_timestamp()
+        for i, tier in enumerate(self.tiers):
+            end = int(source_end // tier.seconds) * tier.seconds
+            start = self.state['watermarks'].get(tier.name)
+            if start is None:
+                if source_start is None:
+                    break
+                start = int(source_start // tier.seconds) * tier.seconds
+            if end > start:
+                if i == 0:
+                    source = samples_to_rollups(self.store.scan(start=start, end=end), self.state['last_connected'])
+                else:
+                    source = self.tiers[i - 1].table.scan(start, end)
+                tier.table.append(combine(source, tier.seconds))
+                self.state['watermarks'][tier.name] = end
+                self._save_state()
+            else:
+                end = start
+            tier.table.prune(now - tier.retention)
+            source_end = end
+            source_start = start
+
+    def select_tier(self, start, step, now=None):
+        """Index of the coarsest tier no coarser than step that still has data from start, -1 for raw samples."""
+        now = time.time() if now is None else now
+        chosen = -1
+        for i, tier in enumerate(self.tiers):
+            if tier.seconds <= step and now - tier.retention <= start:
+                chosen = i
+        if chosen == -1 and now - self.raw_retention > start:
+            # Older than the raw samples and any fine enough tier, take the finest tier that reaches back to start
+            for i, tier in enumerate(self.tiers):
+                if now - tier.retention <= start:
+                    return i
+            return len(self.tiers) - 1
+        return chosen
+
+    def query(self, start, end, step, workers=None):
+        """Rollup records covering [start, end) at the coarsest useful resolution, returns (tier name, records)."""
+        watermarks = self._watermarks()
+        worker_ids = None
+        if workers is not None:
+            worker_ids = self.store.worker_ids(workers)
+            if len(worker_ids) == 0:
+                return 'raw', np.zeros(0, dtype=ROLLUP_DTYPE)
+        index = self.select_tier(start, step)
+        records = self._query_tier(index, start, end, worker_ids, watermarks)
+        return (self.tiers[index].name if index >= 0 else 'raw'), records
+
+    def _query_tier(self, index, start, end, worker_ids, watermarks):
+        if index < 0:
+            return samples_to_rollups(self.store.table.scan(start, end, worker_ids))
+        tier = self.tiers[index]
+        watermark = watermarks.get(tier.name, start)
+        records = tier.table.scan(start, min(end, watermark), worker_ids)
+        if end > watermark:
+            records = np.concatenate([records, self._query_tier(index - 1, max(start, watermark), end, worker_ids, watermarks)])
+        return records
@@ -0,0 +1,347 @@
+import os
+import re
+import json
+import numpy as np
+from datetime import datetime, timezone
+
+# Fixed-width sample record, 21 bytes on disk
+SAMPLE_DTYPE = np.dtype([
+    ('ts', '<f8'),          # unix timestamp (seconds)
+    ('worker', '<u4'),      # index into the store's worker table
+    ('connected', 'u1'),
+    ('hash_rate', '<f8'),
+])
+
+CHUNK_SECONDS = 3600
+CHUNK_FORMAT = '%Y-%m-%d_%H'
+chunk_pattern = re.compile(r'^\d{4}-\d{2}-\d{2}_\d{2}\.bin$')
+
+def chunk_name(start):
+    return datetime.fromtimestamp(start, tz=timezone.utc).strftime(CHUNK_FORMAT) + '.bin'
+
+# Function to decode an API 'workers' mapping into (names, connected, hash_rate) columns
+def decode_workers(workers):
+    count = len(workers)
+    stats = workers.values()
+    names = list(workers)
+    connected = np.fromiter((bool(details.get('connected')) for details in stats), dtype=bool, count=count)
+    hash_rate = np.fromiter((details.get('hash_rate') or 0 for details in stats), dtype='<f8', count=count)
+    return names, connected, hash_rate
+
+def parse_chunk_name(name):
+    dt = datetime.strptime(name[:-len('.bin')], CHUNK_FORMAT).replace(tzinfo=timezone.utc)
+    return int(dt.timestamp())
+
+class ChunkedTable:
+    """Fixed-width records with a 'ts' field, appended to one file per chunk_seconds of time.
+
+    Records are appended in time order and never rewritten, so readers in
+    other processes can scan a chunk while another process is appending to it.
+    """
+
+    def __init__(self, folder, dtype, chunk_seconds):
+        self.folder = folder
+        self.dtype = dtype
+        self.chunk_seconds = chunk_seconds
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+
+    def append(self, records):
+        if len(records) == 0:
+            return
+        starts = (records['ts'] // self.chunk_seconds).astype(np.int64) * self.chunk_seconds
+        for start in np.unique(starts):
+            with open(os.path.join(self.folder, chunk_name(int(start))), 'ab') as f:
+                f.write(records[starts == start].tobytes())
+
+    def merge(self, records):
+        """Add records that may be older than ones already written, keeping every chunk in time order.
+
+        Chunks that gain records from before their last one are rewritten through
+        a temp file, so this is for one-off backfills, not the live append path.
+        """
+        if len(records) == 0:
+            return
+        records = records[np.argsort(records['ts'], kind='stable')]
+        starts = (records['ts'] // self.chunk_seconds).astype(np.int64) * self.chunk_seconds
+        for start in np.unique(starts):
+            name = chunk_name(int(start))
+            added = records[starts == start]
+            path = os.path.join(self.folder, name)
+            existing = self.read_chunk(name) if os.path.exists(path) else added[:0]
+            if len(existing) == 0 or existing['ts'][-1] <= added['ts'][0]:
+                with open(path, 'ab') as f:
+                    f.write(added.tobytes())
+                continue
+            merged = np.concatenate([existing, added])
+            merged = merged[np.argsort(merged['ts'], kind='stable')]
+            tmp_file = path + '.tmp'
+            merged.tofile(tmp_file)
+            os.replace(tmp_file, path)
+
+    def prune(self, cutoff):
+        """Delete every chunk that lies entirely before cutoff, returns the removed file names."""
+        removed = []
+        for start, name in self.chunks():
+            if start + self.chunk_seconds <= cutoff:
+                os.remove(os.path.join(self.folder, name))
+                removed.append(name)
+        return removed
+
+    def truncate(self, cutoff):
+        """Drop every record with ts >= cutoff, returns how many were dropped."""
+        dropped = 0
+        for start, name in self.chunks():
+            if start + self.chunk_seconds <= cutoff:
+                continue
+            path = os.path.join(self.folder, name)
+            records = self.read_chunk(name)
+            keep = int(np.searchsorted(records['ts'], cutoff))
+            dropped += len(records) - keep
+            if keep == 0:
+                os.remove(path)
+            else:
+                os.truncate(path, keep * self.dtype.itemsize)
+        return dropped
+
+    def chunks(self):
+        chunks = [(parse_chunk_name(name), name) for name in os.listdir(self.folder) if chunk_pattern.match(name)]
+        chunks.sort()
+        return chunks
+
+    def read_chunk(self, name, start=0):
+        """The records of a chunk from record number start on."""
+        path = os.path.join(self.folder, name)
+        # Ignore a trailing partial record that is still being written
+        count = os.path.getsize(path) // self.dtype.itemsize - start
+        if count <= 0:
+            return np.empty(0, dtype=self.dtype)
+        return np.fromfile(path, dtype=self.dtype, count=count, offset=start * self.dtype.itemsize)
+
+    def scan(self, start=None, end=None, worker_ids=None):
+        """Return the records with start <= ts < end, optionally limited to an array of worker ids."""
+        parts = []
+        for chunk, name in self.chunks():
+            if start is not None and chunk + self.chunk_seconds <= start:
+                continue
+            if end is not None and chunk >= end:
+                break
+            records = self.read_chunk(name)
+            mask = None
+            if start is not None and chunk < start:
+                mask = records['ts'] >= start
+            if end is not None and chunk + self.chunk_seconds > end:
+                mask = records['ts'] < end if mask is None else mask & (records['ts'] < end)
+            if worker_ids is not None:
+                worker_mask = np.isin(records['worker'], worker_ids)
+                mask = worker_mask if mask is None else mask & worker_mask
+            parts.append(records if mask is None else records[mask])
+
+        if not parts:
+            return np.empty(0, dtype=self.dtype)
+        return np.concatenate(parts)
+
+    def first_timestamp(self):
+        for _, name in self.chunks():
+            records = self.read_chunk(name)
+            if len(records):
+                return float(records['ts'][0])
+        return None
+
+    def last_timestamp(self):
+        for _, name in reversed(self.chunks()):
+            records = self.read_chunk(name)
+            if len(records):
+                return float(records['ts'][-1])
+        return None
+
+class SampleStore:
+    """Append-only store of worker samples, one binary chunk file per UTC hour.
+
+    Worker names are mapped to integer ids kept in workers.json.
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.workers_file = os.path.join(folder, 'workers.json')
+        self.table = ChunkedTable(folder, SAMPLE_DTYPE, CHUNK_SECONDS)
+        self._worker_names = []
+        self._worker_ids = {}
+        self._workers_mtime = None
+        # (chunk name, size, {worker id: last ts}) for the newest chunk
+        self._last_seen = (None, None, {})
+        self._load_workers()
+
+    # Worker table
+
+    def _load_workers(self):
+        try:
+            mtime = os.stat(self.workers_file).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime == self._workers_mtime:
+            return
+        with open(self.workers_file, 'r') as f:
+            names = json.load(f)
+        self._worker_names = names
+        self._worker_ids = {name: i for i, name in enumerate(names)}
+        self._workers_mtime = mtime
+
+    def _save_workers(self):
+        tmp_file = self.workers_file + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump(self._worker_names, f)
+        os.replace(tmp_file, self.workers_file)
+        self._workers_mtime = os.stat(self.workers_file).st_mtime_ns
+
+    def worker_names(self):
+        self._load_workers()
+        return list(self._worker_names)
+
+    def worker_id(self, name, create=False):
+        worker_id = self._worker_ids.get(name)
+        if worker_id is None:
+            self._load_workers()
+            worker_id = self._worker_ids.get(name)
+        if worker_id is None and create:
+            worker_id = len(self._worker_names)
+            self._worker_names.append(name)
+            self._worker_ids[name] = worker_id
+            self._save_workers()
+        return worker_id
+
+    # Writing
+
+    def encode(self, timestamp, workers):
+        """Sample records of one API snapshot (the 'workers' mapping) taken at timestamp, new workers get an id."""
+        names, connected, hash_rate = decode_workers(workers)
+        new_names = [name for name in names if name not in self._worker_ids]
+        if new_names:
+            self._load_workers()
+            new_names = [name for name in new_names if name not in self._worker_ids]
+            for name in new_names:
+                self._worker_ids[name] = len(self._worker_names)
+                self._worker_names.append(name)
+            if new_names:
+                self._save_workers()
+
+        records = np.empty(len(names), dtype=SAMPLE_DTYPE)
+        records['ts'] = timestamp
+        records['worker'] = np.fromiter(map(self._worker_ids.__getitem__, names), dtype='<u4', count=len(names))
+        records['connected'] = connected
+        records['hash_rate'] = hash_rate
+        return records
+
+    def append(self, timestamp, workers):
+        """Append one API snapshot (the 'workers' mapping) taken at timestamp, returns its sample records."""
+        records = self.encode(timestamp, workers)
+        self.append_records(records)
+        return records
+
+    def append_records(self, records):
+        self.table.append(records)
+
+    def prune(self, cutoff):
+        """Delete every chunk that lies entirely before cutoff, returns the removed file names."""
+        return self.table.prune(cutoff)
+
+    # Reading
+
+    def worker_ids(self, names):
+        """Array of the ids of the given worker names, unknown names are left out."""
+        self._load_workers()
+        return np.array([self._worker_ids[name] for name in names if name in self._worker_ids], dtype='<u4')
+
+    def scan(self, start=None, end=None, workers=None):
+        """Return the samples with start <= ts < end, optionally limited to the given worker names."""
+        worker_ids = None
+        if workers is not None:
+            worker_ids = self.worker_ids(workers)
+            if len(worker_ids) == 0:
+                return np.empty(0, dtype=SAMPLE_DTYPE)
+        return self.table.scan(start, end, worker_ids)
+
+    def last_timestamp(self):
+        return self.table.last_timestamp()
+
+    def last_seen(self):
+        """{worker id: last sample ts} for the workers in the newest chunk, only re-read when that chunk grew."""
+        chunks = self.table.chunks()
+        if not chunks:
+            return {}
+        name = chunks[-1][1]
+        try:
+            size = os.path.getsize(os.path.join(self.folder, name))
+        except FileNotFoundError:
+            return self._last_seen[2]
+        if (name, size) != self._last_seen[:2]:
+            records = self.table.read_chunk(name)
+            # Records are in time order, so the last write per worker wins
+            self._last_seen = (name, size, dict(zip(records['worker'].tolist(), records['ts'].tolist())))
+        return self._last_seen[2]
+
+# Function to import the legacy one-file-per-minute JSON snapshots into a store
+def import_json_snapshots(store, data_folder, logger=None, remove=False, rollups=None):
+    """Snapshots the store already has samples at the same time for are skipped, so a rerun adds nothing.
+
+    Only files imported by this run are removed with remove. With rollups (the
+    store's RollupManager) the imported samples behind its watermarks are rolled
+    up into its tiers as well, the puller only compacts past them and drops the
+    raw samples after a day.
+    """
+    datetime_pattern = re.compile(r'^\d{4}-\d{2}-\d{2}_\d{2}\.\d{2}\.\d{2}\.json$')
+    snapshot_files = []
+    for file in os.listdir(data_folder):
+        if datetime_pattern.match(file):
+            try:
+                # Snapshot file names are in local time
+                file_datetime = datetime.strptime(file, '%Y-%m-%d_%H.%M.%S.json')
+            except ValueError:
+                continue
+            snapshot_files.append((file_datetime.timestamp(), file))
+    snapshot_files.sort()
+
+    # Sample timestamps already in the store, read per chunk for the chunks the snapshots fall in
+    stored = {}
+    def is_stored(timestamp):
+        start = int(timestamp // CHUNK_SECONDS) * CHUNK_SECONDS
+        if start not in stored:
+            name = chunk_name(start)
+            exists = os.path.exists(os.path.join(store.folder, name))
+            stored[start] = set(np.unique(store.table.read_chunk(name)['ts']).tolist()) if exists else set()
+        return timestamp in stored[start]
+
+    # Decode every snapshot into records first and write them in one go, a write per snapshot would dominate
+    parts = []
+    imported_files = []
+    skipped = 0
+    for timestamp, file in snapshot_files:
+        if is_stored(timestamp):
+            skipped += 1
+            continue
+        path = os.path.join(data_folder, file)
+        try:
+            with open(path, 'r') as f:
+                json_data = json.load(f)
+        except ValueError:
+            if logger:
+                logger.error(f"Skipping unreadable snapshot {file}")
+            continue
+        parts.append(store.encode(timestamp, json_data.get('workers', {})))
+        imported_files.append(path)
+
+    imported = 0
+    if parts:
+        records = np.concatenate(parts)
+        # The store may already hold later samples from the puller, so merge rather than append
+        store.table.merge(records)
+        imported = len(records)
+        if rollups is not None:
+            rollups.backfill(records)
+    if remove:
+        for path in imported_files:
+            os.remove(path)
+    if logger:
+        logger.info(f"Imported {len(imported_files)} snapshots ({imported} samples) into {store.folder}, "
+                    f"skipped {skipped} already in it")
+    return imported
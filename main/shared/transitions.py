@@ -0,0 +1,177 @@
+import os
+import threading
+from datetime import datetime
+from bisect import bisect_left, bisect_right
+import numpy as np
+from .timeseries import ChunkedTable, SampleStore
+
+# Worker states as written to the log
+CONNECTED = 'connected'         # first seen, up
+DISCONNECTED = 'disconnected'
+ZERO_HASH = 'zero_hash'         # connected with a 0 hash rate
+RECOVERED = 'recovered'         # up again after being down, or back to its usual hash rate after being degraded
+DEGRADED = 'degraded'           # connected, but with a hash rate well below its baseline
+STATES = (CONNECTED, DISCONNECTED, ZERO_HASH, RECOVERED, DEGRADED)
+DOWN_STATES = (DISCONNECTED, ZERO_HASH)
+
+# Function to get the transition state of a worker from its summary or API details
+def worker_state_name(details):
+    if not details['connected']:
+        return DISCONNECTED
+    return ZERO_HASH if details['hash_rate'] == 0 else CONNECTED
+
+# One record per state change, 13 bytes on disk
+TRANSITION_DTYPE = np.dtype([
+    ('ts', '<f8'),
+    ('worker', '<u4'),      # the sample store's worker id
+    ('state', 'u1'),        # index into STATES
+])
+
+# Transitions are rare, a file per 30 days keeps the folder small
+TRANSITION_CHUNK_SECONDS = 30 * 86400
+
+class TransitionLog:
+    """Append-only log of worker state changes, in data/transitions next to the sample store."""
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.table = ChunkedTable(folder, TRANSITION_DTYPE, TRANSITION_CHUNK_SECONDS)
+
+    def append(self, store: SampleStore, timestamp, transitions):
+        """Append (worker name, state, ...) transitions that happened at timestamp, returns the records."""
+        records = np.empty(len(transitions), dtype=TRANSITION_DTYPE)
+        records['ts'] = timestamp
+        records['worker'] = [store.worker_id(transition[0], create=True) for transition in transitions]
+        records['state'] = [STATES.index(transition[1]) for transition in transitions]
+        self.table.append(records)
+        return records
+
+    def seed(self, store: SampleStore, workers, timestamp):
+        """Log the current state of every worker in a worker summary if the log is empty, returns the records.
+
+        Workers known from before the log existed would be missing from the
+        outage report until their next state change otherwise. A worker that is
+        down is logged as down from its disconnected_since, so its outage counts.
+        """
+        if not workers or self.table.last_timestamp() is not None:
+            return np.empty(0, dtype=TRANSITION_DTYPE)
+        seeded = []
+        for worker, details in workers.items():
+            state = worker_state_name(details)
+            since = timestamp
+            if state in DOWN_STATES and details.get('disconnected_since'):
+                try:
+                    # Written by the puller as local time
+                    since = min(datetime.fromisoformat(details['disconnected_since']).timestamp(), timestamp)
+                except ValueError:
+                    pass
+            seeded.append((since, worker, state))
+        seeded.sort()
+        records = np.empty(len(seeded), dtype=TRANSITION_DTYPE)
+        records['ts'] = [since for since, _, _ in seeded]
+        records['worker'] = [store.worker_id(worker, create=True) for _, worker, _ in seeded]
+        records['state'] = [STATES.index(state) for _, _, state in seeded]
+        self.table.append(records)
+        return records
+
+def _new_worker():
+    # Sorted outage starts and ends, ends[-1] is inf while an outage is open
+    return {'starts': [], 'ends': [], 'states': [], 'first_seen': None, 'down': False}
+
+class OutageIndex:
+    """Outage intervals per worker, built from a TransitionLog and extended as the log grows.
+
+    An outage runs from the first down transition after the worker was up to
+    its next 'recovered'. The intervals of one worker are disjoint and sorted,
+    so the ones overlapping a range are found with two bisects.
+    """
+
+    def __init__(self, log: TransitionLog):
+        self.log = log
+        self.lock = threading.Lock()
+        self.workers = {}
+        # (chunk name, records read from it) of the newest chunk read so far
+        self.position = (None, 0)
+
+    def refresh(self):
+        """Read the transitions appended since the last refresh."""
+        with self.lock:
+            chunk, read = self.position
+            for _, name in self.log.table.chunks():
+                # Chunk names sort in time order
+                if chunk is not None and name < chunk:
+                    continue
+                offset = read if name == chunk else 0
+                records = self.log.table.read_chunk(name, offset)
+                self._add(records)
+                self.position = (name, offset + len(records))
+
+    def _add(self, records):
+        for ts, worker_id, state in records.tolist():
+            worker = self.workers.get(worker_id)
+            if worker is None:
+                worker = self.workers[worker_id] = _new_worker()
+            if worker['first_seen'] is None:
+                worker['first_seen'] = ts
+            state = STATES[state]
+            if state in DOWN_STATES:
+                if not worker['down']:
+                    worker['starts'].append(ts)
+                    worker['ends'].append(float('inf'))
+                    worker['states'].append(state)
+                    worker['down'] = True
+            elif worker['down']:
+                worker['ends'][-1] = ts
+                worker['down'] = False
+
+    def stats(self, worker_id, start, end):
+        """Outage statistics of one worker over [start, end), None if it has no transitions before end."""
+        with self.lock:
+            worker = self.workers.get(worker_id)
+            if worker is None or worker['first_seen'] is None or worker['first_seen'] >= end:
+                return None
+            first = bisect_right(worker['ends'], start)
+            last = bisect_left(worker['starts'], end)
+            starts = np.array(worker['starts'][first:last])
+            ends = np.array(worker['ends'][first:last])
+            states = worker['states'][first:last]
+            observed_start = max(start, worker['first_seen'])
+
+        clipped = np.minimum(ends, end) - np.maximum(starts, observed_start)
+        downtime = float(np.clip(clipped, 0, None).sum())
+        observed = end - observed_start
+        # Failures are outages that began inside the range, repairs the ones that ended inside it
+        failures = int(np.count_nonzero(starts >= observed_start))
+        repaired = ends < end
+        uptime = max(observed - downtime, 0)
+        return {
+            'outages': len(starts),
+            'downtime_seconds': downtime,
+            'uptime_seconds': uptime,
+            'availability': uptime / observed if observed > 0 else None,
+            'mtbf_seconds': uptime / failures if failures else None,
+            'mttr_seconds': float((ends[repaired] - starts[repaired]).mean()) if repaired.any() else None,
+            'down_at_end': bool(len(ends) and ends[-1] >= end),
+            'intervals': [{'start': float(s), 'end': float(e) if e != float('inf') else None, 'state': state}
+                          for s, e, state in zip(starts, ends, states)],
+        }
+
+    def report(self, store: SampleStore, start, end, workers=None):
+        """stats() for the given worker names (every worker in the log by default), keyed by name."""
+        self.refresh()
+        names = store.worker_names()
+        if workers is None:
+            with self.lock:
+                worker_ids = sorted(self.workers)
+        else:
+            worker_ids = [worker_id for worker_id in (store.worker_id(name) for name in workers) if worker_id is not None]
+        report = {}
+        for worker_id in worker_ids:
+            stats = self.stats(worker_id, start, end)
+            if stats is not None and worker_id < len(names):
+                report[names[worker_id]] = stats
+        return report
+
+# Function to get the transition log folder of a data folder
+def transitions_folder(data_folder):
+    return os.path.join(data_folder, 'transitions')
@@ -0,0 +1,108 @@
+import os
+import json
+import time
+import threading
+
+SUMMARY_FILE = 'workers_summary.json'
+
+class WorkerState:
+    """Current state of every worker, owned by the puller.
+
+    update() only touches memory. save() rewrites the file at most once per
+    debounce interval, to a temp file that is renamed over workers_summary.json,
+    so readers only ever see a complete file.
+    """
+
+    def __init__(self, data_folder, debounce=5.0):
+        self.path = os.path.join(data_folder, SUMMARY_FILE)
+        self.debounce = debounce
+        self.lock = threading.Lock()
+        self.workers = {}
+        self.version = 0
+        self.dirty = False
+        self.last_save = 0
+        self.timer = None
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r') as f:
+                    self.workers = json.load(f)
+            except ValueError:
+                self.workers = {}
+
+    def get(self, worker):
+        with self.lock:
+            details = self.workers.get(worker)
+            return dict(details) if details is not None else None
+
+    def snapshot(self):
+        with self.lock:
+            return self.version, {worker: dict(details) for worker, details in self.workers.items()}
+
+    def update(self, worker, details):
+        with self.lock:
+            if self.workers.get(worker) == details:
+                return
+            self.workers[worker] = dict(details)
+            self.version += 1
+            self.dirty = True
+
+    def save(self, force=False):
+        """Write the state now if the debounce interval has passed, otherwise schedule it."""
+        with self.lock:
+            if not self.dirty:
+                return
+            wait = self.last_save + self.debounce - time.monotonic()
+            if wait > 0 and not force:
+                if self.timer is None:
+                    self.timer = threading.Timer(wait, self._flush)
+                    self.timer.daemon = True
+                    self.timer.start()
+                return
+            self._write()
+
+    def _flush(self):
+        with self.lock:
+            self.timer = None
+            if self.dirty:
+                self._write()
+
+    def _write(self):
+        tmp_file = self.path + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump(self.workers, f)
+        os.replace(tmp_file, self.path)
+        self.dirty = False
+        self.last_save = time.monotonic()
+
+class WorkerStateReader:
+    """Read side for the webserver: parses workers_summary.json only when the puller replaced it."""
+
+    def __init__(self, data_folder):
+        self.path = os.path.join(data_folder, SUMMARY_FILE)
+        self.lock = threading.Lock()
+        self.file_key = None
+        # (version, workers) swapped as one tuple so readers never see a mix of two versions
+        self.current = (0, {})
+
+    def snapshot(self):
+        """Returns (version, workers); the dict is shared between callers and must not be modified."""
+        try:
+            stat = os.stat(self.path)
+            file_key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            file_key = None
+        if file_key == self.file_key:
+            return self.current
+
+        with self.lock:
+            if file_key != self.file_key:
+                workers = {}
+                if file_key is not None:
+                    try:
+                        with open(self.path, 'r') as f:
+                            workers = json.load(f)
+                    except (FileNotFoundError, ValueError):
+                        return self.current
+                self.current = (self.current[0] + 1, workers)
+                self.file_key = file_key
+            return self.current
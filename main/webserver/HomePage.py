@@ -1,34 +1,47 @@
-from flask import render_template, session, abort, request, Flask
+from flask import render_template, request, Flask
 from flask.views import View
-import os
-import json
 import datetime
-from shared import load_secrets
+from shared.dashboard import DashboardReader
+from .access import check_access
+from .charts import ChartCache
+from .worker_table import WorkerTable, STATUSES, SORTS, DEFAULT_PER_PAGE, MAX_PER_PAGE
+
+# Function to read the worker table's query parameters, unknown values fall back to the defaults
+def table_query():
+    status = request.args.get('status', 'all')
+    sort = request.args.get('sort', 'status')
+    per_page = request.args.get('per_page', DEFAULT_PER_PAGE, type=int) or DEFAULT_PER_PAGE
+    return {
+        'status': status if status in STATUSES else 'all',
+        'prefix': request.args.get('q', '').strip(),
+        'sort': sort if sort in SORTS else 'status',
+        'descending': request.args.get('dir') == 'desc',
+        'page': max(request.args.get('page', 1, type=int) or 1, 1),
+        'per_page': min(max(per_page, 1), MAX_PER_PAGE),
+    }
 
 class HomePage(View):
-    def __init__(self, template, data_folder, app: Flask):
+    def __init__(self, template, worker_table: WorkerTable, dashboard: DashboardReader, chart_cache: ChartCache, app: Flask, chart_mode='png'):
         self.template = template
-        self.data_folder = data_folder
+        self.chart_mode = chart_mode
+        self.worker_table = worker_table
+        self.dashboard = dashboard
+        self.chart_cache = chart_cache
         self.app = app
 
     def dispatch_request(self):
-        secrets = load_secrets()
-
-        passkey = request.args.get("access_key")
+        check_access()
 
-        if secrets["pass-key"] and (not passkey or passkey != secrets["pass-key"]):
-            abort(404)
+        query = table_query()
+        rows, total, counts = self.worker_table.page(**query)
+        pages = max((total + query['per_page'] - 1) // query['per_page'], 1)
+        last_sample_timestamp = self.dashboard.last_timestamp()
+        if last_sample_timestamp is not None:
+            last_modified_time = datetime.datetime.utcfromtimestamp(last_sample_timestamp)
+            last_modified_str = last_modified_time.strftime("%Y-%m-%d %H:%M:%S")
         else:
-            summary_file = os.path.join(self.data_folder, 'workers_summary.json')
-            file_path = os.path.join(self.app.static_folder, 'worker_uptime_pie_chart.png')
-            if os.path.exists(summary_file):
-                with open(summary_file, 'r') as f:
-                    summary_data = json.load(f)
-            else:
-                summary_data = {}
-            if os.path.exists(file_path):
-                last_modified_time = datetime.datetime.utcfromtimestamp(os.path.getmtime(file_path))
-                last_modified_str = last_modified_time.strftime("%Y-%m-%d %H:%M:%S")
-            else:
-                last_modified_str = None
-            return render_template(self.template, summary_data=summary_data, last_updated=last_modified_str)
\ No newline at end of file
+            last_modified_str = None
+        self.chart_cache.refresh()
+        return render_template(self.template, rows=rows, total=total, counts=counts, query=query, pages=pages,
+                               access_key=request.args.get('access_key'), last_updated=last_modified_str,
+                               chart_versions=self.chart_cache.versions(), chart_mode=self.chart_mode)
\ No newline at end of file
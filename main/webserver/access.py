@@ -0,0 +1,11 @@
+from flask import request, abort
+from shared.config import get_config
+
+# Function to reject requests without the configured pass-key
+def check_access():
+    pass_key = get_config().pass_key
+
+    passkey = request.args.get("access_key")
+
+    if pass_key and (not passkey or passkey != pass_key):
+        abort(404)
@@ -0,0 +1,168 @@
+from flask import abort, jsonify, request
+from flask.views import View
+import time
+import math
+import sqlite3
+from datetime import datetime
+from shared.downsample import downsample_rollups, lttb
+from shared.history import HistoryReader
+from shared.rollups import RollupManager
+from shared.timeseries import SampleStore
+from shared.dashboard import DashboardReader
+from .access import check_access
+from .worker_table import WorkerTable
+
+# Upper bound on the number of points any series response returns
+MAX_POINTS = 1000
+DEFAULT_RANGE = 24 * 3600
+
+# Function to parse a time query parameter given as unix seconds or ISO 8601
+def parse_time_arg(name, default):
+    value = request.args.get(name)
+    if value is None or value == '':
+        return default
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            return datetime.fromisoformat(value).timestamp()
+        except ValueError:
+            abort(400, description=f"Invalid '{name}' parameter: {value}")
+    # float() also takes 'nan' and 'inf'
+    if not math.isfinite(seconds):
+        abort(400, description=f"Invalid '{name}' parameter: {value}")
+    return seconds
+
+def _rounded(values):
+    return [round(float(value), 6) for value in values]
+
+class WorkersApi(View):
+    """The workers in the published dashboard snapshot in name order, optionally those starting with q, at most limit."""
+
+    def __init__(self, worker_table: WorkerTable):
+        self.worker_table = worker_table
+
+    def dispatch_request(self):
+        check_access()
+
+        prefix = request.args.get('q', '').strip()
+        limit = request.args.get('limit', type=int)
+        if limit is not None and limit < 0:
+            abort(400, description="'limit' must be 0 or more")
+        workers = []
+        for name, details in self.worker_table.workers(prefix, limit):
+            workers.append({
+                'name': name,
+                'connected': details.get('connected'),
+                'hash_rate': details.get('hash_rate'),
+                'disconnected_since': details.get('disconnected_since'),
+            })
+        return jsonify({'workers': workers})
+
+class WorkerSeriesApi(View):
+    def __init__(self, store: SampleStore, rollups: RollupManager):
+        self.store = store
+        self.rollups = rollups
+
+    def dispatch_request(self, name):
+        check_access()
+
+        if self.store.worker_id(name) is None:
+            abort(404)
+
+        start, end = parse_range()
+        mode = request.args.get('mode', 'steps')
+
+        response = {'worker': name, 'from': start, 'to': end, 'mode': mode}
+
+        if mode == 'lttb':
+            # Picks from the raw samples, so only covers the raw retention
+            samples = self.store.scan(start=start, end=end, workers=[name])
+            # lttb() returns every sample for fewer than 3 points
+            points = max(3, min(request.args.get('points', MAX_POINTS, type=int) or MAX_POINTS, MAX_POINTS))
+            selected = lttb(samples['ts'], samples['hash_rate'], points)
+            response['ts'] = samples['ts'][selected].tolist()
+            response['hash_rate'] = _rounded(samples['hash_rate'][selected])
+            response['connected'] = samples['connected'][selected].astype(bool).tolist()
+        elif mode == 'steps':
+            # Never return more than MAX_POINTS steps, whatever step was asked for
+            step = request.args.get('step', 0, type=float) or 0
+            if not math.isfinite(step):
+                abort(400, description=f"Invalid 'step' parameter: {request.args.get('step')}")
+            step = max(step, math.ceil((end - start) / MAX_POINTS), 1)
+            tier, records = self.rollups.query(start, end, step, [name])
+            edges, mins, maxs, means, connected, disconnects = downsample_rollups(records, start, end, step)
+            response['step'] = step
+            response['tier'] = tier
+            response['ts'] = edges.tolist()
+            response['hash_rate_min'] = _rounded(mins)
+            response['hash_rate_max'] = _rounded(maxs)
+            response['hash_rate_mean'] = _rounded(means)
+            response['connected'] = _rounded(connected)
+            response['disconnects'] = disconnects.astype(int).tolist()
+        else:
+            abort(400, description=f"Unknown mode: {mode}")
+        return jsonify(response)
+
+# Function to get the requested from/to range, the last default_range seconds by default
+def parse_range(default_range=DEFAULT_RANGE):
+    end = parse_time_arg('to', time.time())
+    start = parse_time_arg('from', end - default_range)
+    if end <= start:
+        abort(400, description="'to' must be after 'from'")
+    return start, end
+
+class HistoryApi(View):
+    """Base for the views answered from the history database, 404 unless the sqlite backend is enabled."""
+
+    def __init__(self, history: HistoryReader = None):
+        self.history = history
+
+    def dispatch_request(self, **kwargs):
+        check_access()
+
+        if self.history is None:
+            abort(404, description="The history database is not enabled, set history-backend to sqlite")
+        try:
+            return self.query(**kwargs)
+        except sqlite3.OperationalError as e:
+            # The puller creates the database on its first poll
+            abort(503, description=f"The history database is not available: {e}")
+
+class WorkerHistoryApi(HistoryApi):
+    def query(self, name):
+        start, end = parse_range()
+        history = self.history.worker_history(name, start, end)
+        if history is None:
+            abort(404)
+        samples, transitions = history
+        return jsonify({'worker': name, 'from': start, 'to': end, 'samples': samples, 'transitions': transitions})
+
+class DownApi(HistoryApi):
+    def query(self):
+        start, end = parse_range()
+        return jsonify({'from': start, 'to': end, 'workers': self.history.down_between(start, end)})
+
+class AlertsApi(HistoryApi):
+    def query(self):
+        start, end = parse_range()
+        return jsonify({'from': start, 'to': end, 'alerts': self.history.alerts(start, end)})
+
+class SummaryApi(View):
+    def __init__(self, dashboard: DashboardReader):
+        self.dashboard = dashboard
+
+    def dispatch_request(self):
+        check_access()
+
+        # Totalled by the puller when it published the snapshot
+        summary = self.dashboard.summary()
+        return jsonify({
+            'last_updated': self.dashboard.last_timestamp(),
+            'total_workers': summary['workers'],
+            'connected': summary['connected'],
+            'disconnected': summary['workers'] - summary['connected'],
+            'zero_hash_rate': summary['zero_hash_rate'],
+            'total_hash_rate': summary['total_hash_rate'],
+            'down': summary['down'],
+        })
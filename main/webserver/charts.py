@@ -0,0 +1,118 @@
+from flask import Response, abort, request
+from flask.views import View
+import os
+import gzip
+import time
+import threading
+from datetime import datetime, timezone
+from shared.chart_manifest import CHART_NAMES, MANIFEST_FILE, load_manifest
+
+class ChartCache:
+    """In-memory copy of the rendered charts and their content hashes.
+
+    The manifest written by the puller is checked at most once per interval,
+    so conditional requests are answered from memory.
+    """
+
+    def __init__(self, charts_folder, interval=2.0):
+        self.charts_folder = charts_folder
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.checked = 0
+        self.manifest_mtime = None
+        self.charts = {}
+
+    def refresh(self, force=False):
+        """Reload changed charts from disk, returns True if any chart changed."""
+        now = time.monotonic()
+        if not force and now - self.checked < self.interval:
+            return False
+        with self.lock:
+            self.checked = now
+            try:
+                manifest_mtime = os.stat(os.path.join(self.charts_folder, MANIFEST_FILE)).st_mtime_ns
+                manifest = None if manifest_mtime == self.manifest_mtime else load_manifest(self.charts_folder)
+            except FileNotFoundError:
+                # Charts not written by this version of the puller yet, version them by file stats
+                manifest_mtime = None
+                manifest = {}
+                for name in CHART_NAMES:
+                    try:
+                        stat = os.stat(os.path.join(self.charts_folder, name))
+                    except FileNotFoundError:
+                        continue
+                    manifest[name] = {'hash': f"{stat.st_mtime_ns:x}-{stat.st_size:x}", 'updated': stat.st_mtime}
+            if manifest is None:
+                return False
+
+            charts = {}
+            for name, entry in manifest.items():
+                current = self.charts.get(name)
+                if current and current['etag'] == entry['hash']:
+                    charts[name] = current
+                    continue
+                try:
+                    with open(os.path.join(self.charts_folder, name), 'rb') as f:
+                        data = f.read()
+                except FileNotFoundError:
+                    continue
+                charts[name] = {
+                    'etag': entry['hash'],
+                    'last_modified': datetime.fromtimestamp(int(entry['updated']), tz=timezone.utc),
+                    'data': data,
+                }
+                # PNGs are already compressed, the chart payload shrinks to about a fifth
+                if name.endswith('.json'):
+                    charts[name]['gzip'] = gzip.compress(data, 6)
+            changed = {name: chart['etag'] for name, chart in charts.items()} != self.versions()
+            self.charts = charts
+            self.manifest_mtime = manifest_mtime
+            return changed
+
+    def versions(self):
+        return {name: chart['etag'] for name, chart in self.charts.items()}
+
+    def get(self, name):
+        self.refresh()
+        return self.charts.get(name)
+
+# Function to answer a chart request from memory, with a 304 when the client already has this version
+def chart_response(chart, mimetype, immutable=False):
+    response = Response(mimetype=mimetype)
+    data = chart['data']
+    etag = chart['etag']
+    if 'gzip' in chart:
+        response.vary.add('Accept-Encoding')
+        if 'gzip' in request.accept_encodings:
+            data = chart['gzip']
+            # Each encoding is a different representation, so it gets its own ETag
+            etag += '-gzip'
+            response.content_encoding = 'gzip'
+    response.set_etag(etag)
+    response.last_modified = chart['last_modified']
+    if immutable:
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    else:
+        response.headers['Cache-Control'] = 'no-cache'
+
+    if request.if_none_match.contains(etag) or (
+            not request.if_none_match and request.if_modified_since and request.if_modified_since >= chart['last_modified']):
+        response.status_code = 304
+        return response
+    response.set_data(data)
+    return response
+
+MIMETYPES = {'.png': 'image/png', '.json': 'application/json'}
+
+class ChartView(View):
+    def __init__(self, cache: ChartCache):
+        self.cache = cache
+
+    def dispatch_request(self, name):
+        chart = self.cache.get(name)
+        if chart is None:
+            abort(404)
+
+        # A URL carrying the current version never changes content, older or unversioned URLs must revalidate
+        return chart_response(chart, MIMETYPES.get(os.path.splitext(name)[1], 'application/octet-stream'),
+                              immutable=request.args.get('v') == chart['etag'])
@@ -0,0 +1,140 @@
+from flask import Response, stream_with_context
+from flask.views import View
+import json
+import queue
+import time
+import threading
+from shared.dashboard import DashboardReader
+from .access import check_access
+from .HomePage import table_query
+from .charts import ChartCache
+from .worker_table import WorkerTable
+
+class EventBroker:
+    """Single producer that watches the puller's output and fans events out to every subscriber.
+
+    Only the producer thread touches the disk, once per interval, however many
+    browsers hold an /events connection open. Each subscriber only gets the
+    changes to the worker table page it shows, so a poll costs a page per
+    subscriber rather than the whole fleet. Subscribers that stop reading are
+    dropped once their queue fills up.
+    """
+
+    def __init__(self, dashboard: DashboardReader, worker_table: WorkerTable, chart_cache: ChartCache, interval=2.0, queue_size=100):
+        self.dashboard = dashboard
+        self.worker_table = worker_table
+        self.chart_cache = chart_cache
+        self.interval = interval
+        self.queue_size = queue_size
+        # {subscriber queue: (worker table query, [(name, details)] of the page last sent)}
+        self.subscribers = {}
+        self.lock = threading.Lock()
+        self.thread = None
+        self.summary_version = None
+        self.chart_versions = None
+
+    def subscribe(self, query):
+        """Subscribe to the events of a page showing the worker table for query (the WorkerTable.page arguments)."""
+        subscriber = queue.Queue(maxsize=self.queue_size)
+        rows = self.worker_table.page(**query)[0]
+        with self.lock:
+            self.subscribers[subscriber] = (query, rows)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name='EventBroker', daemon=True)
+                self.thread.start()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            self.subscribers.pop(subscriber, None)
+
+    def is_subscribed(self, subscriber):
+        with self.lock:
+            return subscriber in self.subscribers
+
+    def publish(self, event, data):
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for subscriber in subscribers:
+            self._send(subscriber, event, data)
+
+    def _send(self, subscriber, event, data):
+        try:
+            subscriber.put_nowait(f"event: {event}\ndata: {json.dumps(data)}\n\n")
+        except queue.Full:
+            self.unsubscribe(subscriber)
+
+    # Function to send every subscriber the changes to its own page of the worker table
+    def _publish_pages(self):
+        with self.lock:
+            subscribers = list(self.subscribers.items())
+        for subscriber, (query, previous) in subscribers:
+            rows = self.worker_table.page(**query)[0]
+            sent = dict(previous)
+            changed = {name: details for name, details in rows if name in sent and sent[name] != details}
+            # The page's names in order, only when workers moved into, out of or around it
+            order = [name for name, _ in rows]
+            if order == [name for name, _ in previous]:
+                order = None
+            with self.lock:
+                if subscriber not in self.subscribers:
+                    continue
+                self.subscribers[subscriber] = (query, rows)
+            if changed or order is not None:
+                self._send(subscriber, 'workers', {'changed': changed, 'order': order})
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.poll()
+            except Exception:
+                # Keep the producer alive through half-written files and the like
+                continue
+
+    # Function to check the puller's output once and publish what changed
+    def poll(self):
+        summary_version, _ = self.dashboard.snapshot()
+        if summary_version != self.summary_version:
+            # Every subscriber compares with the page it was last sent, so the first poll needs no baseline
+            self._publish_pages()
+            self.summary_version = summary_version
+
+            last_sample_timestamp = self.dashboard.last_timestamp()
+            if last_sample_timestamp is not None:
+                self.publish('last_updated', {'timestamp': last_sample_timestamp})
+
+        self.chart_cache.refresh(force=True)
+        chart_versions = self.chart_cache.versions()
+        if self.chart_versions is not None and chart_versions != self.chart_versions:
+            self.publish('charts', {'versions': chart_versions})
+        self.chart_versions = chart_versions
+
+class EventStream(View):
+    def __init__(self, broker: EventBroker, keepalive=15):
+        self.broker = broker
+        self.keepalive = keepalive
+
+    def dispatch_request(self):
+        check_access()
+
+        subscriber = self.broker.subscribe(table_query())
+
+        def stream():
+            try:
+                yield "retry: 5000\n\n"
+                while True:
+                    try:
+                        yield subscriber.get(timeout=self.keepalive)
+                    except queue.Empty:
+                        if not self.broker.is_subscribed(subscriber):
+                            # Dropped for falling behind, the browser reconnects and reloads
+                            return
+                        yield ": keepalive\n\n"
+            finally:
+                self.broker.unsubscribe(subscriber)
+
+        response = Response(stream_with_context(stream()), mimetype='text/event-stream')
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['X-Accel-Buffering'] = 'no'
+        return response
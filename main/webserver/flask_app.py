@@ -1,14 +1,25 @@
-import pandas as pd
 from flask import Flask, send_from_directory, request
 import logging as baselogging
 from shared.mylogging import logging
 import os
 import sys
 from .HomePage import HomePage
+from .worker_table import WorkerTable
+from .api import WorkersApi, WorkerSeriesApi, SummaryApi, WorkerHistoryApi, DownApi, AlertsApi
+from .events import EventBroker, EventStream
+from .charts import ChartCache, ChartView
+from .worker_charts import WorkerChartCache, WorkerChartView
+from .metrics import MetricsView, instrument
+from .outages import OutagesApi, OutagesPage
 import signal
 import json
 
-from shared import load_secrets
+from shared.config import get_config, install_reload_signal
+from shared.timeseries import SampleStore
+from shared.rollups import RollupManager
+from shared.dashboard import DashboardReader
+from shared.history import HISTORY_FILE, HistoryReader
+from shared.transitions import OutageIndex, TransitionLog, transitions_folder
 
 def _windows_enable_ANSI(std_id):
     """Enable Windows 10 cmd.exe ANSI VT Virtual Terminal Processing."""
@@ -58,26 +69,63 @@ def _windows_enable_ANSI(std_id):
 app = Flask(__name__)
 app.static_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
 
+logging.configure('webserver')
 logger = logging.get_logger(loglevel=baselogging.DEBUG, loggername=__name__)
 
-# Define the data and secrets folder paths
+# Define the data folder path
 app_path = os.path.dirname(os.path.abspath(__file__))
 data_folder = os.path.join(app_path, '..', 'data')
-secrets_folder = os.path.join(app_path, '..', 'secrets')
 
-secrets_file = os.path.join(secrets_folder, 'secrets.json')
-secrets = load_secrets()
-home_page = HomePage.as_view("Home", "index.html", data_folder=data_folder, app=app)
+config = get_config()
+store = SampleStore(os.path.join(data_folder, 'samples'))
+rollups = RollupManager(store, config.rollup_retention_days)
+# Worker state and fleet totals as last published by the puller, mapped read-only
+dashboard = DashboardReader(data_folder, store)
+outage_index = OutageIndex(TransitionLog(transitions_folder(data_folder)))
+history = None
+if config.history_backend == 'sqlite':
+    history = HistoryReader(os.path.join(data_folder, HISTORY_FILE), config.history_read_connections)
+chart_cache = ChartCache(app.static_folder)
+worker_table = WorkerTable(dashboard)
+home_page = HomePage.as_view("Home", "index.html", worker_table=worker_table, dashboard=dashboard, chart_cache=chart_cache, app=app, chart_mode=config.chart_mode)
+workers_api = WorkersApi.as_view("WorkersApi", worker_table=worker_table)
+worker_series_api = WorkerSeriesApi.as_view("WorkerSeriesApi", store=store, rollups=rollups)
+summary_api = SummaryApi.as_view("SummaryApi", dashboard=dashboard)
+worker_history_api = WorkerHistoryApi.as_view("WorkerHistoryApi", history=history)
+down_api = DownApi.as_view("DownApi", history=history)
+alerts_api = AlertsApi.as_view("AlertsApi", history=history)
+event_broker = EventBroker(dashboard, worker_table, chart_cache)
+event_stream = EventStream.as_view("Events", broker=event_broker)
+chart_view = ChartView.as_view("Charts", cache=chart_cache)
+worker_chart_cache = WorkerChartCache(store, rollups, config.worker_chart_cache_mb * 2**20)
+worker_chart_view = WorkerChartView.as_view("WorkerCharts", cache=worker_chart_cache)
+outages_api = OutagesApi.as_view("OutagesApi", index=outage_index, store=store)
+outages_page = OutagesPage.as_view("Outages", "outages.html", index=outage_index, store=store)
+metrics_view = MetricsView.as_view("Metrics", dashboard=dashboard, data_folder=data_folder)
 
 routes = {
     '/': {'handler': home_page, 'methods': ['GET']},
     '/Index': {'handler': home_page, 'methods': ['GET']},
+    '/api/workers': {'handler': workers_api, 'methods': ['GET']},
+    '/api/workers/<name>/series': {'handler': worker_series_api, 'methods': ['GET']},
+    '/api/summary': {'handler': summary_api, 'methods': ['GET']},
+    '/api/workers/<name>/history': {'handler': worker_history_api, 'methods': ['GET']},
+    '/api/down': {'handler': down_api, 'methods': ['GET']},
+    '/api/alerts': {'handler': alerts_api, 'methods': ['GET']},
+    '/api/outages': {'handler': outages_api, 'methods': ['GET']},
+    '/outages': {'handler': outages_page, 'methods': ['GET']},
+    '/events': {'handler': event_stream, 'methods': ['GET']},
+    '/charts/<name>': {'handler': chart_view, 'methods': ['GET']},
+    '/workers/<name>/chart.<any(png, svg):fmt>': {'handler': worker_chart_view, 'methods': ['GET']},
+    '/metrics': {'handler': metrics_view, 'methods': ['GET']},
 }
 
 # Register the routes with Flask
 for path, route_info in routes.items():
     app.add_url_rule(path, view_func=route_info['handler'], endpoint=path, methods=route_info['methods'])
 
+instrument(app)
+
 
 @app.route('/shutdown', methods=['POST'])
 def shutdown():
@@ -103,7 +151,8 @@ def run():
         _windows_enable_ANSI(2)
     except Exception:
         print("Failed to enable ANSI")
-    app.run(host=secrets["http_listen_on"], port=secrets["http_port"])
+    install_reload_signal()
+    app.run(host=config.http_listen_on, port=config.http_port)
 # @app.route('/worker_uptime_pie_chart.png')
 # def uptime_chart():
 #     return send_from_directory(app.static_folder, 'worker_uptime_pie_chart.png')
@@ -0,0 +1,84 @@
+from flask import Flask, Response, g, request
+from flask.views import View
+import os
+import time
+from datetime import datetime
+from shared.metrics import REGISTRY, TEXTFILE, Registry
+from shared.dashboard import DashboardReader
+from .access import check_access
+
+request_seconds = REGISTRY.histogram('litepool_http_request_seconds', 'Time to handle a request', ['endpoint', 'method', 'status'])
+
+# Function to time every request the app handles
+def instrument(app: Flask):
+    @app.before_request
+    def start_timer():
+        g.request_start = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        start = g.get('request_start')
+        if start is not None:
+            # The endpoint is the route pattern, so worker names do not become labels
+            request_seconds.observe(time.perf_counter() - start, endpoint=request.endpoint or 'unmatched',
+                                    method=request.method, status=response.status_code)
+        return response
+
+# Function to split exposition text into (metric name, text) per metric family
+def _families(text):
+    name = None
+    lines = []
+    for line in text.splitlines(keepends=True):
+        if line.startswith('# HELP '):
+            if lines:
+                yield name, ''.join(lines)
+            name = line.split(' ', 3)[2]
+            lines = []
+        lines.append(line)
+    if lines:
+        yield name, ''.join(lines)
+
+class MetricsView(View):
+    """Prometheus text format: this process's metrics, per-worker gauges and the puller's last published metrics.
+
+    Under gunicorn every worker process has its own registry, so the request
+    metrics cover the worker that answered the scrape.
+    """
+
+    def __init__(self, dashboard: DashboardReader, data_folder):
+        self.dashboard = dashboard
+        self.textfile = os.path.join(data_folder, TEXTFILE)
+
+    def dispatch_request(self):
+        check_access()
+
+        # Built per scrape, so workers that are gone stop being exported
+        workers = Registry()
+        connected = workers.gauge('litepool_worker_connected', 'Whether the worker is connected (1) or not (0)', ['worker'])
+        hash_rate = workers.gauge('litepool_worker_hash_rate', 'Last reported hash rate of the worker', ['worker'])
+        down = workers.gauge('litepool_worker_seconds_since_disconnect',
+                             'Seconds since the worker disconnected or dropped to a 0 hash rate, 0 while it is up', ['worker'])
+        last_sample = workers.gauge('litepool_last_sample_timestamp_seconds', 'Time of the newest stored sample')
+
+        now = time.time()
+        _, summary_data = self.dashboard.snapshot()
+        for worker, details in summary_data.items():
+            connected.set(1 if details.get('connected') else 0, worker=worker)
+            hash_rate.set(details.get('hash_rate') or 0, worker=worker)
+            since = details.get('disconnected_since')
+            try:
+                # Written by the puller as local time
+                down.set(max(now - datetime.fromisoformat(since).timestamp(), 0) if since else 0, worker=worker)
+            except ValueError:
+                down.set(0, worker=worker)
+        last_timestamp = self.dashboard.last_timestamp()
+        if last_timestamp is not None:
+            last_sample.set(last_timestamp)
+
+        body = REGISTRY.render() + workers.render()
+        try:
+            with open(self.textfile, 'r') as f:
+                body += ''.join(block for name, block in _families(f.read()) if name not in REGISTRY.metrics)
+        except FileNotFoundError:
+            pass
+        return Response(body, content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,56 @@
+from flask import jsonify, render_template, request
+from flask.views import View
+from datetime import datetime
+from shared.timeseries import SampleStore
+from shared.transitions import OutageIndex
+from .access import check_access
+from .api import parse_range
+
+# Outages are reported over the last week unless from/to say otherwise
+DEFAULT_RANGE = 7 * 24 * 3600
+
+# Function to format a number of seconds as e.g. '2d 3h', '5m 10s'
+def format_duration(seconds):
+    if seconds is None:
+        return '-'
+    seconds = int(round(seconds))
+    parts = []
+    for unit, size in (('d', 86400), ('h', 3600), ('m', 60), ('s', 1)):
+        if seconds >= size or (unit == 's' and not parts):
+            parts.append(f'{seconds // size}{unit}')
+            seconds %= size
+        if len(parts) == 2:
+            break
+    return ' '.join(parts)
+
+class OutagesApi(View):
+    """Outage count, downtime, availability, MTBF and MTTR per worker over a range, from the transition log."""
+
+    def __init__(self, index: OutageIndex, store: SampleStore):
+        self.index = index
+        self.store = store
+
+    def dispatch_request(self):
+        check_access()
+
+        start, end = parse_range(DEFAULT_RANGE)
+        workers = request.args.getlist('worker') or None
+        return jsonify({'from': start, 'to': end, 'workers': self.index.report(self.store, start, end, workers)})
+
+class OutagesPage(View):
+    def __init__(self, template, index: OutageIndex, store: SampleStore):
+        self.template = template
+        self.index = index
+        self.store = store
+
+    def dispatch_request(self):
+        check_access()
+
+        start, end = parse_range(DEFAULT_RANGE)
+        workers = request.args.getlist('worker') or None
+        report = self.index.report(self.store, start, end, workers)
+        rows = sorted(report.items(), key=lambda item: (-item[1]['downtime_seconds'], item[0]))
+        return render_template(self.template, rows=rows, format_duration=format_duration,
+                               start=datetime.fromtimestamp(start).strftime('%Y-%m-%dT%H:%M'),
+                               end=datetime.fromtimestamp(end).strftime('%Y-%m-%dT%H:%M'),
+                               access_key=request.args.get('access_key'))
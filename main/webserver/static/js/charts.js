@@ -0,0 +1,306 @@
+// Small canvas charts for the client chart mode: line (with a min/max band), bar and pie.
+// Line and bar charts show the values under the pointer, drag across a chart to zoom, double click to reset.
+var LiteCharts = (function() {
+    var COLORS = ['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd'];
+    var PADDING = {left: 70, right: 20, top: 30, bottom: 50};
+
+    function formatNumber(value) {
+        var abs = Math.abs(value);
+        if (abs >= 1e9) return (value / 1e9).toFixed(2) + 'G';
+        if (abs >= 1e6) return (value / 1e6).toFixed(2) + 'M';
+        if (abs >= 1e3) return (value / 1e3).toFixed(2) + 'k';
+        return String(Math.round(value * 100) / 100);
+    }
+
+    function formatTime(seconds) {
+        var date = new Date(seconds * 1000);
+        return date.toLocaleDateString(undefined, {month: 'short', day: 'numeric'}) + ' ' +
+            date.toLocaleTimeString(undefined, {hour: '2-digit', minute: '2-digit'});
+    }
+
+    // Size the canvas for the screen's pixel ratio, returns the context and the size in CSS pixels
+    function setup(canvas) {
+        var ratio = window.devicePixelRatio || 1;
+        var width = canvas.clientWidth;
+        var height = canvas.clientHeight;
+        canvas.width = width * ratio;
+        canvas.height = height * ratio;
+        var context = canvas.getContext('2d');
+        context.setTransform(ratio, 0, 0, ratio, 0, 0);
+        context.clearRect(0, 0, width, height);
+        context.font = '12px Arial, sans-serif';
+        return {context: context, width: width, height: height};
+    }
+
+    function drawTitle(view, title) {
+        view.context.fillStyle = '#000';
+        view.context.textAlign = 'center';
+        view.context.fillText(title, view.width / 2, 18);
+    }
+
+    function drawMessage(view, message) {
+        view.context.fillStyle = '#666';
+        view.context.textAlign = 'center';
+        view.context.fillText(message, view.width / 2, view.height / 2);
+    }
+
+    // A chart over points 0..count-1 of x that can be hovered and zoomed; draw(view, scale, first, last) does the plotting
+    function Chart(canvas, options, draw) {
+        this.canvas = canvas;
+        this.options = options;
+        this.draw = draw;
+        this.first = 0;
+        this.last = options.x.length - 1;
+        this.hover = null;
+        this.dragStart = null;
+        this.bind();
+        this.render();
+    }
+
+    Chart.prototype.update = function(options) {
+        this.options = options;
+        this.first = 0;
+        this.last = options.x.length - 1;
+        this.render();
+    };
+
+    Chart.prototype.plotWidth = function() {
+        return this.canvas.clientWidth - PADDING.left - PADDING.right;
+    };
+
+    // Index of the point under a pointer x position
+    Chart.prototype.indexAt = function(offsetX) {
+        var count = this.last - this.first;
+        var position = (offsetX - PADDING.left) / this.plotWidth();
+        return Math.max(this.first, Math.min(this.last, this.first + Math.round(position * count)));
+    };
+
+    Chart.prototype.bind = function() {
+        var chart = this;
+        this.canvas.addEventListener('mousemove', function(e) {
+            chart.hover = chart.indexAt(e.offsetX);
+            chart.dragEnd = e.offsetX;
+            chart.render();
+        });
+        this.canvas.addEventListener('mouseleave', function() {
+            chart.hover = null;
+            chart.dragStart = null;
+            chart.render();
+        });
+        this.canvas.addEventListener('mousedown', function(e) {
+            chart.dragStart = e.offsetX;
+        });
+        this.canvas.addEventListener('mouseup', function(e) {
+            if (chart.dragStart !== null && Math.abs(e.offsetX - chart.dragStart) > 5) {
+                var a = chart.indexAt(Math.min(chart.dragStart, e.offsetX));
+                var b = chart.indexAt(Math.max(chart.dragStart, e.offsetX));
+                if (b > a) {
+                    chart.first = a;
+                    chart.last = b;
+                }
+            }
+            chart.dragStart = null;
+            chart.render();
+        });
+        this.canvas.addEventListener('dblclick', function() {
+            chart.first = 0;
+            chart.last = chart.options.x.length - 1;
+            chart.render();
+        });
+        window.addEventListener('resize', function() {
+            chart.render();
+        });
+    };
+
+    Chart.prototype.render = function() {
+        var view = setup(this.canvas);
+        var options = this.options;
+        drawTitle(view, options.title);
+        if (!options.x.length) {
+            drawMessage(view, 'Insufficient Data Available');
+            return;
+        }
+        var context = view.context;
+        var first = this.first, last = this.last;
+        var values = [];
+        (options.series || []).forEach(function(series) {
+            values = values.concat(series.values.slice(first, last + 1));
+        });
+        if (options.band) {
+            values = values.concat(options.band.max.slice(first, last + 1));
+        }
+        var yMax = options.yMax || Math.max.apply(null, values.concat([1]));
+        var plotHeight = view.height - PADDING.top - PADDING.bottom;
+        var plotWidth = this.plotWidth();
+        var count = Math.max(last - first, 1);
+        var scale = {
+            x: function(i) { return PADDING.left + (i - first) / count * plotWidth; },
+            y: function(value) { return PADDING.top + plotHeight - value / yMax * plotHeight; },
+            step: plotWidth / count
+        };
+
+        // Axes, 5 y ticks and about 8 time labels
+        context.strokeStyle = '#ccc';
+        context.fillStyle = '#333';
+        context.textAlign = 'right';
+        for (var tick = 0; tick <= 5; tick++) {
+            var y = scale.y(yMax * tick / 5);
+            context.beginPath();
+            context.moveTo(PADDING.left, y);
+            context.lineTo(PADDING.left + plotWidth, y);
+            context.stroke();
+            context.fillText(formatNumber(yMax * tick / 5), PADDING.left - 6, y + 4);
+        }
+        context.textAlign = 'center';
+        var every = Math.max(1, Math.ceil((last - first + 1) / 8));
+        for (var i = first; i <= last; i += every) {
+            context.fillText(formatTime(options.x[i]), scale.x(i), view.height - PADDING.bottom + 18);
+        }
+        if (options.yLabel) {
+            context.save();
+            context.translate(14, PADDING.top + plotHeight / 2);
+            context.rotate(-Math.PI / 2);
+            context.fillText(options.yLabel, 0, 0);
+            context.restore();
+        }
+
+        this.draw(view, scale, first, last);
+
+        // Legend under the time labels
+        var legendX = PADDING.left;
+        context.textAlign = 'left';
+        (options.series || []).forEach(function(series, index) {
+            context.fillStyle = series.color || COLORS[index];
+            context.fillRect(legendX, view.height - 16, 12, 12);
+            context.fillStyle = '#333';
+            context.fillText(series.label, legendX + 16, view.height - 6);
+            legendX += context.measureText(series.label).width + 40;
+        });
+
+        if (this.dragStart !== null && this.dragEnd !== undefined) {
+            context.fillStyle = 'rgba(0, 0, 0, 0.1)';
+            context.fillRect(Math.min(this.dragStart, this.dragEnd), PADDING.top, Math.abs(this.dragEnd - this.dragStart), plotHeight);
+        }
+        if (this.hover !== null) {
+            this.drawTooltip(view, scale, this.hover);
+        }
+    };
+
+    Chart.prototype.drawTooltip = function(view, scale, index) {
+        var context = view.context;
+        var options = this.options;
+        var x = scale.x(index);
+        context.strokeStyle = '#888';
+        context.beginPath();
+        context.moveTo(x, PADDING.top);
+        context.lineTo(x, view.height - PADDING.bottom);
+        context.stroke();
+
+        var lines = [formatTime(options.x[index])];
+        (options.series || []).forEach(function(series) {
+            lines.push(series.label + ': ' + formatNumber(series.values[index]));
+        });
+        var width = Math.max.apply(null, lines.map(function(line) { return context.measureText(line).width; })) + 12;
+        var left = x + width + 10 > view.width ? x - width - 10 : x + 10;
+        context.fillStyle = 'rgba(255, 255, 255, 0.9)';
+        context.strokeStyle = '#888';
+        context.fillRect(left, PADDING.top, width, lines.length * 16 + 6);
+        context.strokeRect(left, PADDING.top, width, lines.length * 16 + 6);
+        context.fillStyle = '#000';
+        context.textAlign = 'left';
+        lines.forEach(function(line, i) {
+            context.fillText(line, left + 6, PADDING.top + 16 * (i + 1));
+        });
+    };
+
+    // options: {title, x (unix seconds), series: [{label, values, color}], band: {min, max} (optional), yLabel}
+    function line(canvas, options) {
+        return new Chart(canvas, options, function(view, scale, first, last) {
+            var context = view.context;
+            var band = this.options.band;
+            if (band) {
+                context.fillStyle = 'rgba(31, 119, 180, 0.2)';
+                context.beginPath();
+                for (var i = first; i <= last; i++) {
+                    context.lineTo(scale.x(i), scale.y(band.max[i]));
+                }
+                for (var j = last; j >= first; j--) {
+                    context.lineTo(scale.x(j), scale.y(band.min[j]));
+                }
+                context.closePath();
+                context.fill();
+            }
+            this.options.series.forEach(function(series, index) {
+                context.strokeStyle = series.color || COLORS[index];
+                context.lineWidth = 2;
+                context.beginPath();
+                for (var i = first; i <= last; i++) {
+                    context.lineTo(scale.x(i), scale.y(series.values[i]));
+                }
+                context.stroke();
+                context.lineWidth = 1;
+            });
+        });
+    }
+
+    // options: {title, x (unix seconds), series: [{label, values}] (one series), yMax, yLabel}
+    function bar(canvas, options) {
+        return new Chart(canvas, options, function(view, scale, first, last) {
+            var context = view.context;
+            var series = this.options.series[0];
+            var width = Math.max(scale.step * 0.8, 1);
+            context.fillStyle = series.color || COLORS[0];
+            for (var i = first; i <= last; i++) {
+                var top = scale.y(series.values[i]);
+                context.fillRect(scale.x(i) - width / 2, top, width, scale.y(0) - top);
+            }
+        });
+    }
+
+    // options: {title, slices: [{label, value, color}]}
+    function pie(canvas, options) {
+        var chart = {
+            options: options,
+            update: function(options) {
+                this.options = options;
+                this.render();
+            },
+            render: function() {
+                var view = setup(canvas);
+                var context = view.context;
+                var slices = this.options.slices.filter(function(slice) { return slice.value > 0; });
+                var total = slices.reduce(function(sum, slice) { return sum + slice.value; }, 0);
+                drawTitle(view, this.options.title);
+                if (!total) {
+                    drawMessage(view, 'Insufficient Data Available');
+                    return;
+                }
+                var radius = Math.min(view.width, view.height - 40) / 2 - 10;
+                var centerX = view.width / 2, centerY = view.height / 2 + 10;
+                var angle = -Math.PI / 2;
+                slices.forEach(function(slice, index) {
+                    var sweep = slice.value / total * Math.PI * 2;
+                    context.fillStyle = slice.color || COLORS[index];
+                    context.beginPath();
+                    context.moveTo(centerX, centerY);
+                    context.arc(centerX, centerY, radius, angle, angle + sweep);
+                    context.closePath();
+                    context.fill();
+                    var middle = angle + sweep / 2;
+                    context.fillStyle = '#fff';
+                    context.textAlign = 'center';
+                    context.fillText(slice.label + ' ' + (slice.value / total * 100).toFixed(1) + '%',
+                        centerX + Math.cos(middle) * radius * 0.6, centerY + Math.sin(middle) * radius * 0.6);
+                    angle += sweep;
+                });
+            }
+        };
+        window.addEventListener('resize', function() {
+            chart.render();
+        });
+        chart.render();
+        return chart;
+    }
+
+    return {line: line, bar: bar, pie: pie, formatNumber: formatNumber};
+})();
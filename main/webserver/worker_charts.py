@@ -0,0 +1,131 @@
+from flask import abort
+from flask.views import View
+import io
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from datetime import datetime, timezone
+from shared.downsample import downsample_rollups
+from shared.rollups import RollupManager
+from shared.timeseries import SampleStore
+from .access import check_access
+from .charts import chart_response
+
+CHART_RANGE = 24 * 3600
+CHART_STEP = 300
+MIMETYPES = {'png': 'image/png', 'svg': 'image/svg+xml'}
+
+def draw_worker_chart(name, edges, mins, maxs, means, connected, fmt):
+    # Imported on first render, matplotlib would otherwise add most of the webserver's start up time
+    from matplotlib.figure import Figure
+
+    figure = Figure(figsize=(12, 8))
+    hash_axes, connected_axes = figure.subplots(2, 1, sharex=True, gridspec_kw={'height_ratios': [3, 1]})
+    if len(edges):
+        times = [datetime.fromtimestamp(edge) for edge in edges]
+        hash_axes.fill_between(times, mins, maxs, alpha=0.3, label='Min/Max Hashrate')
+        hash_axes.plot(times, means, label='Average Hashrate')
+        hash_axes.legend()
+        connected_axes.step(times, connected * 100, where='post')
+    else:
+        hash_axes.text(0.5, 0.5, 'Insufficient Data Available', ha='center', va='center', transform=hash_axes.transAxes)
+    hash_axes.set_title(f'Worker {name} Over Last 24 Hours')
+    hash_axes.set_ylabel('Hashrate')
+    connected_axes.set_ylabel('Connected %')
+    connected_axes.set_ylim(0, 105)
+    connected_axes.set_xlabel('Time')
+    figure.autofmt_xdate()
+    figure.tight_layout()
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format=fmt)
+    return buffer.getvalue()
+
+class WorkerChartCache:
+    """Per-worker charts rendered on first request and kept in an LRU bounded by max_bytes.
+
+    A chart is keyed on the worker's last sample time, so it is redrawn once new
+    data for that worker arrives; a worker with no recent samples is keyed on the
+    current chart step instead, as its 24 hour window still moves on. Concurrent requests for a chart that is being
+    drawn wait for that render instead of starting their own.
+    """
+
+    def __init__(self, store: SampleStore, rollups: RollupManager, max_bytes=32 * 2**20):
+        self.store = store
+        self.rollups = rollups
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.charts = OrderedDict()
+        self.size = 0
+        self.pending = {}
+
+    def get(self, name, fmt):
+        worker_id = self.store.worker_id(name)
+        if worker_id is None:
+            return None
+        key = (name, fmt)
+        version = self.store.last_seen().get(worker_id)
+        if version is None:
+            # Missing from the newest chunk, redraw once per step as old data leaves the chart's range
+            version = int(time.time() // CHART_STEP) * CHART_STEP
+
+        with self.lock:
+            chart = self.charts.get(key)
+            if chart is not None and chart['version'] == version:
+                self.charts.move_to_end(key)
+                return chart
+            future = self.pending.get(key)
+            owner = future is None
+            if owner:
+                future = self.pending[key] = Future()
+
+        if not owner:
+            return future.result()
+        try:
+            chart = self._render(name, fmt, version)
+            future.set_result(chart)
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                del self.pending[key]
+                if future.exception() is None:
+                    self._put(key, chart)
+        return chart
+
+    def _render(self, name, fmt, version):
+        end = time.time()
+        start = end - CHART_RANGE
+        _, records = self.rollups.query(start, end, CHART_STEP, [name])
+        edges, mins, maxs, means, connected, _ = downsample_rollups(records, start, end, CHART_STEP)
+        data = draw_worker_chart(name, edges, mins, maxs, means, connected, fmt)
+        return {
+            'version': version,
+            'etag': hashlib.sha256(data).hexdigest()[:32],
+            'last_modified': datetime.fromtimestamp(int(version), tz=timezone.utc),
+            'data': data,
+        }
+
+    def _put(self, key, chart):
+        previous = self.charts.pop(key, None)
+        if previous is not None:
+            self.size -= len(previous['data'])
+        self.charts[key] = chart
+        self.size += len(chart['data'])
+        while self.size > self.max_bytes and len(self.charts) > 1:
+            _, evicted = self.charts.popitem(last=False)
+            self.size -= len(evicted['data'])
+
+class WorkerChartView(View):
+    def __init__(self, cache: WorkerChartCache):
+        self.cache = cache
+
+    def dispatch_request(self, name, fmt):
+        check_access()
+
+        chart = self.cache.get(name, fmt)
+        if chart is None:
+            abort(404)
+        return chart_response(chart, MIMETYPES[fmt])
@@ -0,0 +1,113 @@
+import threading
+from bisect import bisect_left
+from datetime import datetime
+from shared.dashboard import DashboardReader
+
+STATUSES = ('all', 'down', 'zero_hash', 'healthy')
+SORTS = ('status', 'name', 'hash_rate', 'down_for')
+DEFAULT_PER_PAGE = 100
+MAX_PER_PAGE = 500
+
+# Function to classify a worker summary as 'down', 'zero_hash' or 'healthy'
+def worker_status(details):
+    if not details.get('connected'):
+        return 'down'
+    return 'zero_hash' if not details.get('hash_rate') else 'healthy'
+
+def _down_since(details):
+    since = details.get('disconnected_since')
+    if not since:
+        return float('inf')
+    try:
+        # Written by the puller as local time
+        return datetime.fromisoformat(since).timestamp()
+    except ValueError:
+        return float('inf')
+
+class WorkerTable:
+    """Sorted views of the worker state for the worker table, rebuilt only when the puller publishes a new state.
+
+    Every (status, sort) pair keeps its own ordered list of names, so a page is
+    a slice of one list. A name prefix search bisects the list of all names in
+    name order and then filters and sorts only the matches.
+    """
+
+    def __init__(self, dashboard: DashboardReader):
+        self.dashboard = dashboard
+        self.lock = threading.Lock()
+        self.version = None
+        # (workers, {(status, sort): names}, names in name order, {status: count}, sort keys, ranks) swapped as one tuple
+        self.current = self._build({})
+
+    def _build(self, workers):
+        keys = {}
+        for name, details in workers.items():
+            status = worker_status(details)
+            keys[name] = {
+                'status': status,
+                'hash_rate': details.get('hash_rate') or 0,
+                'down_since': _down_since(details),
+            }
+        names = sorted(keys)
+        orders = {}
+        sort_keys = {
+            # Down workers first, longest down at the top, then zero hash rate, then healthy by name
+            'status': lambda name: ({'down': 0, 'zero_hash': 1, 'healthy': 2}[keys[name]['status']], keys[name]['down_since'], name),
+            'name': None,
+            'hash_rate': lambda name: (keys[name]['hash_rate'], name),
+            # Longest down first comes from the earliest down_since, workers that are up sort last
+            'down_for': lambda name: (keys[name]['down_since'], name),
+        }
+        for sort, key in sort_keys.items():
+            ordered = names if key is None else sorted(names, key=key)
+            orders[('all', sort)] = ordered
+            for status in STATUSES[1:]:
+                orders[(status, sort)] = [name for name in ordered if keys[name]['status'] == status]
+        counts = {status: len(orders[(status, 'name')]) for status in STATUSES}
+        # Position of every worker in each order, to sort the matches of a name search
+        ranks = {sort: {name: i for i, name in enumerate(orders[('all', sort)])} for sort in SORTS}
+        return workers, orders, names, counts, keys, ranks
+
+    def _refresh(self):
+        version, workers = self.dashboard.snapshot()
+        if version == self.version:
+            return self.current
+        with self.lock:
+            if version != self.version:
+                self.current = self._build(workers)
+                self.version = version
+            return self.current
+
+    def names(self):
+        """All worker names in name order; the list is shared and must not be modified."""
+        return self._refresh()[2]
+
+    def workers(self, prefix='', limit=None):
+        """[(name, details)] of the first limit (default all) workers whose name starts with prefix, in name order."""
+        workers, _, names, _, _, _ = self._refresh()
+        if prefix:
+            names = names[bisect_left(names, prefix):bisect_left(names, prefix + '\uffff')]
+        if limit is not None:
+            names = names[:limit]
+        return [(name, workers[name]) for name in names]
+
+    def page(self, status='all', prefix='', sort='status', descending=False, page=1, per_page=DEFAULT_PER_PAGE):
+        """Returns ([(name, details)] for the page, number of matching workers, {status: count})."""
+        workers, orders, names, counts, keys, ranks = self._refresh()
+        if prefix:
+            first = bisect_left(names, prefix)
+            last = bisect_left(names, prefix + '\uffff')
+            ordered = [name for name in names[first:last] if status == 'all' or keys[name]['status'] == status]
+            if sort != 'name':
+                ordered.sort(key=ranks[sort].__getitem__)
+        else:
+            ordered = orders[(status, sort)]
+
+        total = len(ordered)
+        start = (page - 1) * per_page
+        end = min(start + per_page, total)
+        if descending:
+            rows = [ordered[total - 1 - i] for i in range(start, end)]
+        else:
+            rows = ordered[start:end]
+        return [(name, workers[name]) for name in rows], total, counts
@@ -2,12 +2,13 @@ from .flask_app import app
 import logging
 
 if __name__ == "__main__":
-    from shared import load_secrets
-    secrets = load_secrets()
+    from shared.config import get_config, install_reload_signal
+    config = get_config()
+    install_reload_signal()
 
     try:
         from waitress import serve
         logging.basicConfig(level=logging.DEBUG)
-        serve(app, host=secrets["http_listen_on"], port=secrets["http_port"], _quiet = False)
+        serve(app, host=config.http_listen_on, port=config.http_port, threads=32, _quiet = False)
     except ImportError:
         print("Module 'waitress' is not available.")
\ No newline at end of file